@@ -1,28 +1,130 @@
 # main.py
-import pygame, sys, pytmx, math
+import sys, os
+
+# Modo headless (sin ventana ni audio reales): --bench, --replay, --validate
+# o RUSTWALKER_HEADLESS=1.
+# Se decide antes de importar pygame para que SDL use los drivers "dummy".
+# Se mira el nombre de cada opción (también en la forma --replay=archivo);
+# un prefijo (--ben) cuenta también: parse_args no acepta abreviaturas y lo
+# rechaza, pero sin llegar a abrir la ventana.
+REPORT_FLAGS = ("--bench", "--replay", "--validate")
+
+def _report_mode(argv):
+    for arg in argv:
+        name = arg.split("=", 1)[0]
+        if len(name) > 2 and name.startswith("--") and any(f.startswith(name) for f in REPORT_FLAGS):
+            return True
+    return False
+
+HEADLESS = _report_mode(sys.argv[1:]) or os.environ.get("RUSTWALKER_HEADLESS") == "1"
+if HEADLESS:
+    os.environ["RUSTWALKER_HEADLESS"] = "1"  # lo heredan los procesos hijos
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # stdout queda para el JSON
+
+import pygame, pytmx, math, threading, time
+import numpy as np
+import array, gc, hashlib, json, mmap, random, struct, zlib
+import xml.etree.ElementTree as ElementTree
+from functools import partial
+from collections import OrderedDict, deque
 from pathlib import Path
 
+
+def log(*args):
+    """Mensajes de diagnóstico: van a stderr para que stdout solo lleve los informes JSON"""
+    print(*args, file=sys.stderr)
+
 # -----------------------
 # Configuración básica
 # -----------------------
 pygame.mixer.pre_init(44100, -16, 2, 512)
 pygame.init()   
 pygame.mixer.init()
-pygame.mixer.music.set_volume(0.1)  # volumen música
 WIDTH, HEIGHT = 1024, 768
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("RUSTWALKER")
 clock = pygame.time.Clock()
 FONT = pygame.font.SysFont("dejavusans", 40)
+DEBUG_FONT = pygame.font.SysFont("dejavusans", 14)
 
+PROJECT_DIR = Path(os.path.dirname(os.path.abspath(__file__)))  # raíz del proyecto (grabaciones)
 ASSET_DIR = Path("assets")
 MEDIA_DIR = Path("media")
+MAP_FILES = [
+    ASSET_DIR/"maps"/"Mapa1.tmx",
+    ASSET_DIR/"maps"/"Mapa2.tmx",
+]
 
 icon_img = pygame.image.load(str(ASSET_DIR/"logo.webp"))
 pygame.display.set_icon(icon_img)
 
 # DEBUG visual (pon True para ver si on_ground se está calculando)
 DEBUG = False
+# Fusionar tiles sólidos contiguos en rects grandes (False = un rect por tile, útil para depurar)
+MERGE_COLLISION_RECTS = True
+
+# Atlas de texturas: los PNG de assets/animations se empaquetan recortados en una sola imagen
+TEXTURE_ATLAS = True
+ATLAS_DIR = Path(".cache")/"atlas"
+ATLAS_SOURCE_DIR = ASSET_DIR/"animations"
+ATLAS_MAX_WIDTH = 1024       # px por fila de estanterías
+ATLAS_PADDING = 1
+ATLAS_VERSION = 1
+
+# Audio
+AUDIO_CHANNELS = 16          # canales del mixer (2 reservados para la música)
+MUSIC_VOLUME = 0.1
+MUSIC_FADE_MS = 1200         # duración del fundido cruzado entre pistas
+MUSIC_CACHE_TRACKS = 3       # pistas decodificadas que se guardan en memoria
+                             # (PCM 44.1 kHz estéreo: ~10 MiB por minuto de pista)
+
+# Texto: superficies de texto renderizado que se guardan (LRU)
+TEXT_CACHE_MAX = 256
+
+# Caché de tiles pre-renderizados por bloques (chunks)
+TILE_CHUNK_SIZE = 512          # px por lado de cada chunk
+TILE_CACHE_MAX_MB = 48         # memoria máxima de chunks en caché
+TILE_CHUNK_EVICT_DIST = 3      # chunks fuera de cámara a partir de los que se liberan
+
+# Caché binaria de niveles (se regenera sola si cambia el TMX)
+LEVEL_CACHE = True
+LEVEL_CACHE_DIR = Path(".cache")/"levels"
+LEVEL_CACHE_MAGIC = b"RWLV"
+LEVEL_CACHE_VERSION = 2
+
+# Instantáneas del estado dinámico (checkpoints, volver al menú)
+SNAPSHOT_MAGIC = b"RWSS"
+SNAPSHOT_VERSION = 2
+
+# Simulación a paso fijo (independiente del render)
+SIM_HZ = 120                 # pasos de física por segundo
+MAX_SIM_STEPS = 8            # máximo de pasos de recuperación por frame (evita la espiral de la muerte)
+RENDER_FPS = 60              # límite de frames dibujados por segundo
+BUSY_LOOP = False            # tick_busy_loop al jugar: menos jitter a cambio de CPU
+UNFOCUSED_FPS = 10           # límite con la ventana sin foco o minimizada
+MENU_IDLE_TIMEOUT_MS = 500   # el menú quieto duerme en event.wait hasta un evento o este tiempo
+INTERP_SNAP_DIST = 64        # px: saltos mayores (respawn, cambio de mapa) no se interpolan
+DIRTY_RECTS = True           # volcar solo las regiones cambiadas (display.update) si la cámara está quieta
+
+# Perfilado (F3 muestra el panel, F4 graba/guarda una traza Chrome)
+PROFILE_HISTORY = 240                 # frames de historial para percentiles y gráfica
+PROFILE_TRACE_MAX_EVENTS = 2_000_000  # límite de eventos de la traza
+PROFILE_COUNTERS = ("blits", "alloc_blocks", "enemies_sim", "enemies_drawn", "dirty_rects")
+
+# Regiones de actividad (px alrededor de la cámara)
+CULL_DRAW_MARGIN = 64        # entidades fuera de cámara + margen no se dibujan
+SIM_ACTIVE_MARGIN = 256      # enemigos a esta distancia se simulan cada paso
+SIM_LOD_MARGIN = 1024        # más allá del activo y hasta aquí: cada SIM_LOD_INTERVAL pasos
+SIM_LOD_INTERVAL = 4         # más lejos aún quedan congelados y se ponen al día al volver
+
+# Rejilla dinámica para colisiones entre entidades (láseres/jugador contra enemigos)
+ENTITY_GRID_CELL = 128
+
+# Pools de objetos (capacidad fija; si se agotan, el disparo/explosión se descarta)
+LASER_POOL_SIZE = 64
+EXPLOSION_POOL_SIZE = 64
 
 # Helper de carga con fallback
 def load_image(path, convert_alpha=True):
@@ -30,7 +132,7 @@ def load_image(path, convert_alpha=True):
         img = pygame.image.load(str(path))
         return img.convert_alpha() if convert_alpha else img.convert()
     except Exception as e:
-        print(f"Error cargando imagen: {path}, {e}")
+        log(f"Error cargando imagen: {path}, {e}")
         w, h = (64, 64)
         surf = pygame.Surface((w, h), pygame.SRCALPHA)
         surf.fill((255, 0, 255, 128))
@@ -38,12 +140,1580 @@ def load_image(path, convert_alpha=True):
         pygame.draw.line(surf, (0, 0, 0), (0, h), (w, 0), 3)
         return surf
 
+# Animaciones conocidas: nombre -> lista de rutas de frames
+ANIMATIONS = {
+    "player_idle": [ASSET_DIR/f"animations/idle/de_pie{i}.png" for i in (1, 2)],
+    "player_run": [ASSET_DIR/f"animations/running/corriendo{i}.png" for i in (1, 2)],
+    "player_jump": [ASSET_DIR/f"animations/jump/jump{i}.png" for i in range(1, 5)],
+    "player_attack": [ASSET_DIR/f"animations/attack/atack{i}.png" for i in range(1, 12)],
+    "dron": [ASSET_DIR/f"animations/enemies/dron/dron{i}.png" for i in range(1, 8)],
+    "slime": [ASSET_DIR/f"animations/enemies/slime/slime{i}.png" for i in range(1, 6)],
+    "explosion": [ASSET_DIR/f"animations/explosion/explosion{i}.png" for i in range(1, 6)],
+}
+
+def _atlas_key(paths):
+    """Huella de los PNG de origen (ruta, mtime, tamaño) y del formato del atlas"""
+    h = hashlib.sha1(f"{ATLAS_VERSION}:{ATLAS_PADDING}:{ATLAS_MAX_WIDTH}".encode())
+    for p in paths:
+        st = p.stat()
+        h.update(f"{p.as_posix()}:{st.st_mtime_ns}:{st.st_size}\n".encode())
+    return h.hexdigest()
+
+def pack_atlas(paths, out_dir=ATLAS_DIR):
+    """
+    Empaqueta las imágenes paths en un atlas: recorta los bordes transparentes
+    de cada una y las coloca por estanterías (de más alta a más baja) en filas
+    de hasta ATLAS_MAX_WIDTH px. Escribe atlas.png y atlas.json (por frame:
+    rect en el atlas, desplazamiento del recorte y tamaño original).
+    Devuelve el índice.
+    """
+    images = []
+    for p in paths:
+        img = pygame.image.load(str(p))
+        trim = img.get_bounding_rect()
+        if not trim.w or not trim.h:
+            trim = pygame.Rect(0, 0, 1, 1)
+        images.append((p, img, trim))
+
+    order = sorted(range(len(images)), key=lambda i: (-images[i][2].h, -images[i][2].w))
+    placed = {}
+    x = y = shelf_h = width = 0
+    for i in order:
+        trim = images[i][2]
+        if x and x + trim.w > ATLAS_MAX_WIDTH:
+            x, y, shelf_h = 0, y + shelf_h + ATLAS_PADDING, 0
+        placed[i] = (x, y)
+        width = max(width, x + trim.w)
+        x += trim.w + ATLAS_PADDING
+        shelf_h = max(shelf_h, trim.h)
+
+    atlas = pygame.Surface((max(1, width), max(1, y + shelf_h)), pygame.SRCALPHA, 32)
+    frames = {}
+    for i, (p, img, trim) in enumerate(images):
+        ax, ay = placed[i]
+        # BLEND_RGBA_MAX sobre fondo (0, 0, 0, 0) copia los píxeles tal cual (sin premultiplicar)
+        atlas.blit(img, (ax, ay), trim, special_flags=pygame.BLEND_RGBA_MAX)
+        frames[p.as_posix()] = {"rect": [ax, ay, trim.w, trim.h], "offset": [trim.x, trim.y],
+                                "size": list(img.get_size())}
+    out_dir.mkdir(parents=True, exist_ok=True)
+    pygame.image.save(atlas, str(out_dir/"atlas.png"))
+    index = {"version": ATLAS_VERSION, "key": _atlas_key(paths), "size": list(atlas.get_size()),
+             "frames": frames}
+    # el índice se escribe el último: si falta o no cuadra, se vuelve a empaquetar
+    (out_dir/"atlas.json").write_text(json.dumps(index))
+    return index
+
+def load_atlas(paths, out_dir=ATLAS_DIR):
+    """Atlas de paths, empaquetándolo antes si no existe o cambió algún PNG: (superficie, índice)"""
+    index = None
+    try:
+        index = json.loads((out_dir/"atlas.json").read_text())
+        if index.get("version") != ATLAS_VERSION or index.get("key") != _atlas_key(paths):
+            index = None
+    except (OSError, ValueError):
+        index = None
+    if index is None:
+        t0 = time.perf_counter()
+        index = pack_atlas(paths, out_dir)
+        log(f"Atlas de texturas: {len(paths)} frames empaquetados en "
+              f"{index['size'][0]}x{index['size'][1]} ({(time.perf_counter() - t0) * 1000.0:.1f} ms)")
+    return pygame.image.load(str(out_dir/"atlas.png")).convert_alpha(), index
+
+
+class AssetRegistry:
+    """
+    Registro central de imágenes: cada animación se carga una sola vez, se
+    guarda también volteada en horizontal y se reparte por referencia.
+    Con atlas, los frames son subsuperficies recortadas de una sola imagen
+    (y de su copia volteada); offsets/sizes guardan dónde iba el recorte
+    dentro del frame original, así que hay que dibujar con draw_pos() y
+    crear rects con rect().
+    hits/misses permiten comprobar que nada se recarga a mitad de nivel.
+    """
+    def __init__(self, animations, atlas_dir=None):
+        self.animations = animations
+        self.atlas_dir = atlas_dir
+        self._atlas = None  # (atlas, atlas volteado, frames del índice), o False si no hay
+        self._cache = {}  # clave -> (frames derecha, frames izquierda)
+        self.offsets = {}  # superficie recortada -> (dx, dy) dentro del frame original
+        self.sizes = {}    # superficie recortada -> tamaño original
+        self.hits = 0
+        self.misses = 0
+        self.disk_loads = 0
+
+    def _load_atlas(self):
+        if self._atlas is None:
+            self._atlas = False
+            paths = sorted(ATLAS_SOURCE_DIR.rglob("*.png")) if self.atlas_dir else []
+            if paths:
+                try:
+                    surf, index = load_atlas(paths, self.atlas_dir)
+                except Exception as e:
+                    log(f"No se pudo usar el atlas de texturas: {e}")
+                else:
+                    self._atlas = (surf, pygame.transform.flip(surf, True, False), index["frames"])
+        return self._atlas
+
+    def _load(self, path):
+        """(derecha, izquierda) de una imagen: del atlas si está en él, si no de disco"""
+        atlas = self._load_atlas()
+        entry = atlas[2].get(Path(path).as_posix()) if atlas else None
+        if entry is None:
+            self.disk_loads += 1
+            img = load_image(path)
+            return img, pygame.transform.flip(img, True, False)
+        right_atlas, left_atlas, _ = atlas
+        x, y, w, h = entry["rect"]
+        ox, oy = entry["offset"]
+        size = tuple(entry["size"])
+        right = right_atlas.subsurface((x, y, w, h))
+        left = left_atlas.subsurface((right_atlas.get_width() - x - w, y, w, h))
+        self.offsets[right] = (ox, oy)
+        self.offsets[left] = (size[0] - ox - w, oy)
+        self.sizes[right] = self.sizes[left] = size
+        return right, left
+
+    def _entry(self, key, paths):
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        pairs = [self._load(p) for p in paths]
+        entry = ([r for r, _ in pairs], [l for _, l in pairs])
+        self._cache[key] = entry
+        return entry
+
+    def draw_pos(self, image, x, y):
+        """Dónde blitear image para que quede como el frame original en (x, y)"""
+        dx, dy = self.offsets.get(image, (0, 0))
+        return x + dx, y + dy
+
+    def rect(self, image, **anchor):
+        """Rect del tamaño original del frame, colocado con p. ej. center=(x, y)"""
+        rect = pygame.Rect((0, 0), self.sizes.get(image) or image.get_size())
+        for name, value in anchor.items():
+            setattr(rect, name, value)
+        return rect
+
+    def frames(self, name, direction=1):
+        """Frames de la animación name mirando a la derecha (1) o izquierda (-1)"""
+        right, left = self._entry(name, self.animations[name])
+        return left if direction == -1 else right
+
+    def image(self, path, direction=1):
+        """Imagen suelta (no animada) compartida"""
+        right, left = self._entry(str(path), [path])
+        return (left if direction == -1 else right)[0]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache),
+                "disk_loads": self.disk_loads, "atlas_frames": len(self._atlas[2]) if self._atlas else 0}
+
+ASSETS = AssetRegistry(ANIMATIONS, ATLAS_DIR if TEXTURE_ATLAS else None)
+
+# efectos de sonido: nombre -> (archivo, volumen, prioridad, voces simultáneas máximas)
+SOUNDS = {
+    "move": (MEDIA_DIR/"audio"/"movimiento.mp3", 0.1, 0, 1),
+    "explosion": (MEDIA_DIR/"audio"/"explosion.mp3", 0.7, 1, 4),
+    "jump": (MEDIA_DIR/"audio"/"salto.mp3", 0.8, 2, 1),
+    "attack": (MEDIA_DIR/"audio"/"ataque.mp3", 0.3, 2, 2),
+}
+
 def load_sound(path):
     try:
         return pygame.mixer.Sound(path)
     except Exception:
         return None
 
+
+class AudioManager:
+    """
+    Sonido del juego:
+    - efectos (SOUNDS) decodificados una vez con preload()
+    - canales de efectos en un pool con prioridades: cada efecto tiene un
+      máximo de voces; si se supera, o no hay canal libre ni uno de menor
+      prioridad que robar, la voz se descarta (voices_dropped)
+    - música por pistas decodificadas en hilos de fondo (prefetch) y fundido
+      cruzado entre dos canales reservados; update() la arranca en cuanto está.
+      Las pistas se decodifican enteras (no en streaming): pygame.mixer.music
+      solo tiene un stream y no permite fundir dos pistas a la vez. Con las
+      pistas actuales (~1-1.5 min, 9-15 MiB en PCM) la caché de
+      MUSIC_CACHE_TRACKS ronda los 40 MiB; pistas mucho más largas pedirían
+      streaming con fundido en serie en vez de cruzado
+    En headless no suena nada.
+    """
+    def __init__(self, specs, channels=AUDIO_CHANNELS, enabled=True):
+        self.specs = specs
+        self.enabled = enabled
+        self.sounds = {}
+        self.channels = []
+        self.voices = []  # por canal de efectos: (nombre, prioridad, orden) o None
+        self.music_channels = ()
+        self.music_active = 0
+        self.music_current = None  # pista que suena (ruta) o None
+        self.music_wanted = None   # pista pedida con play_music()
+        self.music_fade_ms = MUSIC_FADE_MS
+        self.music_cache = OrderedDict()  # ruta -> Sound decodificado
+        self.music_jobs = {}              # ruta -> hilo decodificando
+        self.lock = threading.Lock()
+        self._seq = 0
+        self.plays = 0
+        self.voices_dropped = 0
+        self.voices_stolen = 0
+        self.decode_ms = 0.0        # efectos
+        self.music_decode_ms = 0.0  # pistas (en hilos de fondo)
+        if enabled:
+            pygame.mixer.set_num_channels(channels)
+            pygame.mixer.set_reserved(2)  # Sound.play() nunca usa los canales de música
+            self.music_channels = (pygame.mixer.Channel(0), pygame.mixer.Channel(1))
+            self.channels = [pygame.mixer.Channel(i) for i in range(2, channels)]
+            self.voices = [None] * len(self.channels)
+
+    def preload(self):
+        """Decodifica todos los efectos (una sola vez)"""
+        if not self.enabled:
+            return
+        for name, (path, volume, _, _) in self.specs.items():
+            if name in self.sounds:
+                continue
+            t0 = time.perf_counter()
+            sound = load_sound(path)
+            self.decode_ms += (time.perf_counter() - t0) * 1000.0
+            if sound:
+                sound.set_volume(volume)
+            self.sounds[name] = sound
+
+    def play(self, name, loops=0):
+        """Reproduce el efecto name en un canal del pool; devuelve el canal o None si se descartó"""
+        sound = self.sounds.get(name)
+        if sound is None:
+            return None
+        _, _, priority, max_voices = self.specs[name]
+        voices = self.voices
+        free = victim = None
+        same = 0
+        for i, ch in enumerate(self.channels):
+            v = voices[i]
+            if v is not None and not ch.get_busy():
+                v = voices[i] = None
+            if v is None:
+                if free is None:
+                    free = i
+            elif v[0] == name:
+                same += 1
+            elif v[1] < priority and (victim is None or v[1:] < voices[victim][1:]):
+                victim = i
+        if same >= max_voices:
+            self.voices_dropped += 1
+            return None
+        if free is None:
+            if victim is None:
+                self.voices_dropped += 1
+                return None
+            # robar la voz más antigua de menor prioridad
+            self.voices_stolen += 1
+            free = victim
+        self._seq += 1
+        ch = self.channels[free]
+        ch.play(sound, loops=loops)
+        voices[free] = (name, priority, self._seq)
+        self.plays += 1
+        return ch
+
+    def is_playing(self, name):
+        return any(v is not None and v[0] == name and self.channels[i].get_busy()
+                   for i, v in enumerate(self.voices))
+
+    def stop(self, name):
+        for i, v in enumerate(self.voices):
+            if v is not None and v[0] == name:
+                self.channels[i].stop()
+                self.voices[i] = None
+
+    def prefetch(self, path):
+        """Empieza a decodificar la pista path en un hilo (si no está ya lista o en curso)"""
+        if not self.enabled or path is None or not Path(path).exists():
+            return
+        key = str(path)
+        with self.lock:
+            if key in self.music_cache or key in self.music_jobs:
+                return
+            job = threading.Thread(target=self._decode_music, args=(key,), daemon=True)
+            self.music_jobs[key] = job
+        job.start()
+
+    def _decode_music(self, key):
+        t0 = time.perf_counter()
+        try:
+            sound = pygame.mixer.Sound(key)
+        except Exception as e:
+            log(f"No se pudo decodificar la música {key}: {e}")
+            sound = None
+        with self.lock:
+            self.music_jobs.pop(key, None)
+            self.music_decode_ms += (time.perf_counter() - t0) * 1000.0
+            if sound is None:
+                return
+            self.music_cache[key] = sound
+            # expulsar las pistas más antiguas salvo la que suena y la pedida
+            for old in list(self.music_cache):
+                if len(self.music_cache) <= MUSIC_CACHE_TRACKS:
+                    break
+                if old not in (self.music_current, self.music_wanted, key):
+                    del self.music_cache[old]
+
+    def play_music(self, path):
+        """Pide la pista path (None = silencio); sin bloquear: suena cuando esté decodificada"""
+        if not self.enabled:
+            return
+        self.music_wanted = str(path) if path else None
+        self.prefetch(path)
+        self.update()
+
+    def update(self):
+        """Aplica el cambio de música pendiente con fundido cruzado (llamar una vez por frame)"""
+        want = self.music_wanted
+        if not self.enabled or want == self.music_current:
+            return
+        fade = self.music_fade_ms
+        old = self.music_channels[self.music_active]
+        if want is None:
+            old.fadeout(fade)
+            self.music_current = None
+            return
+        with self.lock:
+            sound = self.music_cache.get(want)
+            if sound is not None:
+                self.music_cache.move_to_end(want)
+            pending = want in self.music_jobs
+        if sound is None:
+            if not pending:
+                self.music_wanted = self.music_current  # no se pudo decodificar: seguir como estaba
+            return
+        old.fadeout(fade)
+        self.music_active ^= 1
+        new = self.music_channels[self.music_active]
+        new.set_volume(MUSIC_VOLUME)
+        new.play(sound, loops=-1, fade_ms=fade)
+        self.music_current = want
+
+    def stats(self):
+        return {"plays": self.plays, "voices_dropped": self.voices_dropped,
+                "voices_stolen": self.voices_stolen, "decode_ms": round(self.decode_ms, 2),
+                "music_decode_ms": round(self.music_decode_ms, 2),
+                "music_tracks": len(self.music_cache)}
+
+AUDIO = AudioManager(SOUNDS, enabled=not HEADLESS)
+
+
+class TextCache:
+    """
+    Textos ya renderizados por (texto, color, fuente), con expulsión LRU.
+    Para cadenas que casi nunca cambian (menú, nombre del mundo): el
+    render con la fuente se hace una vez y después es una búsqueda.
+    """
+    def __init__(self, max_entries=TEXT_CACHE_MAX):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, color, font=None):
+        font = font or FONT
+        key = (text, tuple(color), font)
+        surf = self._cache.get(key)
+        if surf is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = font.render(text, True, color)
+        self._cache[key] = surf
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return surf
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)}
+
+TEXT = TextCache()
+
+
+class GlyphAtlas:
+    """
+    Fuente de mapa de bits: cada carácter se renderiza una vez en una sola
+    superficie y las cadenas se dibujan blit a blit desde ella. Para texto que
+    cambia cada frame (contadores, FPS, tiempos) donde cachear la cadena
+    entera no sirve. Sin kerning: pensado para números y etiquetas cortas.
+    """
+    def __init__(self, font, color, chars="0123456789.:-/% "):
+        self.font = font
+        self.color = tuple(color)
+        self.height = font.get_linesize()
+        self.atlas = None
+        self.glyphs = {}  # carácter -> Rect dentro del atlas
+        self._add(chars)
+
+    def _add(self, chars):
+        """Añade caracteres nuevos al atlas (se rehace solo cuando aparece uno desconocido)"""
+        chars = "".join(dict.fromkeys(c for c in chars if c not in self.glyphs))
+        if not chars:
+            return
+        rendered = [self.font.render(c, True, self.color) for c in chars]
+        x = self.atlas.get_width() if self.atlas else 0
+        width = x + sum(img.get_width() for img in rendered)
+        atlas = pygame.Surface((max(1, width), self.height), pygame.SRCALPHA).convert_alpha()
+        if self.atlas:
+            atlas.blit(self.atlas, (0, 0))
+        for c, img in zip(chars, rendered):
+            atlas.blit(img, (x, 0))
+            self.glyphs[c] = pygame.Rect(x, 0, img.get_width(), self.height)
+            x += img.get_width()
+        self.atlas = atlas
+
+    def draw(self, surf, text, pos):
+        """Dibuja text en pos (esquina superior izquierda); devuelve el Rect ocupado"""
+        self._add(text)
+        x, y = pos
+        glyphs, atlas = self.glyphs, self.atlas
+        blit = surf.blit
+        for c in text:
+            area = glyphs[c]
+            blit(atlas, (x, y), area)
+            x += area.w
+        return pygame.Rect(pos[0], y, x - pos[0], self.height)
+
+def merge_tile_rects(cells, tw, th):
+    """
+    Fusiona celdas sólidas contiguas en el mínimo de rects posible.
+    cells: iterable de (x, y) en coordenadas de tile.
+    Primero agrupa tramos horizontales por fila y luego une tramos
+    idénticos (mismo x inicial y final) de filas consecutivas.
+    """
+    rows = {}
+    for x, y in cells:
+        rows.setdefault(y, []).append(x)
+
+    rects = []
+    open_runs = {}  # (x0, x1) -> [y0, alto] de los tramos que siguen creciendo
+    prev_y = None
+    for y in sorted(rows):
+        xs = sorted(rows[y])
+        # tramos horizontales de la fila
+        runs = []
+        start = prev = xs[0]
+        for x in xs[1:]:
+            if x != prev + 1:
+                runs.append((start, prev + 1))
+                start = x
+            prev = x
+        runs.append((start, prev + 1))
+
+        # los tramos solo continúan si la fila anterior es la inmediatamente superior
+        contiguous = prev_y is not None and y == prev_y + 1
+        next_runs = {}
+        for run in runs:
+            if contiguous and run in open_runs:
+                y0, h = open_runs.pop(run)
+                next_runs[run] = [y0, h + 1]
+            else:
+                next_runs[run] = [y, 1]
+        for (x0, x1), (y0, h) in open_runs.items():
+            rects.append(pygame.Rect(x0 * tw, y0 * th, (x1 - x0) * tw, h * th))
+        open_runs = next_runs
+        prev_y = y
+
+    for (x0, x1), (y0, h) in open_runs.items():
+        rects.append(pygame.Rect(x0 * tw, y0 * th, (x1 - x0) * tw, h * th))
+
+    # orden estable (arriba-abajo, izquierda-derecha) como el recorrido por tiles
+    rects.sort(key=lambda r: (r.y, r.x))
+    return rects
+
+
+# -----------------------
+# Perfilado
+# -----------------------
+class Profiler:
+    """
+    Acumula milisegundos por sección dentro del frame actual y guarda un
+    historial para percentiles y gráficas. Puede grabar una traza en
+    formato Chrome (chrome://tracing / Perfetto).
+    Uso: t0 = time.perf_counter(); ...; PROFILER.add("seccion", t0)
+    Si está desactivado, add() y count() solo hacen una comprobación.
+    """
+    def __init__(self, history=PROFILE_HISTORY):
+        self.enabled = False
+        self.current = {}   # sección -> ms en el frame actual
+        self.counts = {}    # contador -> valor en el frame actual
+        self.totals = {}    # sección -> ms acumulados
+        self.frames = 0
+        self.history_len = history
+        self.history = {}   # sección/contador -> deque con los últimos frames
+        self.tracing = False
+        self.trace_events = []
+        self._origin = time.perf_counter()
+
+    def add(self, name, t0):
+        if self.enabled:
+            t1 = time.perf_counter()
+            self.current[name] = self.current.get(name, 0.0) + (t1 - t0) * 1000.0
+            if self.tracing:
+                self.trace_events.append(("X", name, t0, t1))
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        for name, ms in self.current.items():
+            self.totals[name] = self.totals.get(name, 0.0) + ms
+        # las secciones que no se ejecutaron este frame cuentan como 0
+        for name in self.history.keys() | self.current.keys() | self.counts.keys():
+            value = self.current.get(name, self.counts.get(name, 0))
+            hist = self.history.get(name)
+            if hist is None:
+                hist = self.history[name] = deque(maxlen=self.history_len)
+            hist.append(value)
+        if self.tracing:
+            now = time.perf_counter()
+            for name, value in self.counts.items():
+                self.trace_events.append(("C", name, now, value))
+            if len(self.trace_events) > PROFILE_TRACE_MAX_EVENTS:
+                log("Traza llena, se detiene la grabación")
+                self.tracing = False
+        self.current.clear()
+        self.counts.clear()
+        self.frames += 1
+
+    def percentiles(self, name, ps=(50, 95, 99)):
+        """Percentiles del historial de name (ms o valor del contador)"""
+        data = sorted(self.history.get(name, ()))
+        if not data:
+            return [0.0 for _ in ps]
+        return [data[min(len(data) - 1, int(p / 100.0 * len(data)))] for p in ps]
+
+    def reset(self):
+        self.current.clear()
+        self.counts.clear()
+        self.totals.clear()
+        self.history.clear()
+        self.frames = 0
+
+    def start_trace(self):
+        self.trace_events = []
+        self.tracing = True
+
+    def dump_trace(self, path):
+        """Escribe la traza grabada en formato Chrome trace (JSON) y la detiene"""
+        self.tracing = False
+        events = []
+        for kind, name, t0, value in self.trace_events:
+            ts = (t0 - self._origin) * 1e6
+            if kind == "X":
+                events.append({"name": name, "ph": "X", "ts": ts, "dur": (value - t0) * 1e6,
+                               "pid": os.getpid(), "tid": 1})
+            else:
+                events.append({"name": name, "ph": "C", "ts": ts, "pid": os.getpid(),
+                               "args": {name: value}})
+        Path(path).write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+        log(f"Traza guardada en {path} ({len(events)} eventos)")
+        self.trace_events = []
+
+PROFILER = Profiler()
+
+
+class FramePacer:
+    """
+    Política de ritmo de frames del bucle principal:
+    - jugando: clock.tick(target_fps), o tick_busy_loop si busy_loop (menos jitter)
+    - sin foco o minimizada: UNFOCUSED_FPS
+    - en reposo (menú sin cambios): duerme en event.wait hasta que llega un
+      evento o pasan MENU_IDLE_TIMEOUT_MS, sin gastar CPU
+    Guarda los intervalos entre frames para informar de FPS y jitter.
+    """
+    def __init__(self, clock, target_fps=RENDER_FPS, busy_loop=BUSY_LOOP):
+        self.clock = clock
+        self.target_fps = target_fps
+        self.busy_loop = busy_loop
+        self.focused = True
+        self.minimized = False
+        self.mode = "play"
+        self.intervals = deque(maxlen=PROFILE_HISTORY)  # ms entre frames (sin los de reposo)
+        self._last = time.perf_counter()
+
+    def handle_event(self, event):
+        if event.type == pygame.WINDOWFOCUSLOST:
+            self.focused = False
+        elif event.type == pygame.WINDOWFOCUSGAINED:
+            self.focused = True
+        elif event.type == pygame.WINDOWMINIMIZED:
+            self.minimized = True
+        elif event.type in (pygame.WINDOWRESTORED, pygame.WINDOWMAXIMIZED):
+            self.minimized = False
+
+    @property
+    def should_render(self):
+        return not self.minimized
+
+    def wait(self, idle=False):
+        """Espera al siguiente frame según la política; devuelve (dt en ms, eventos)"""
+        prev_mode = self.mode
+        if idle and not HEADLESS:
+            self.mode = "idle"
+            first = pygame.event.wait(MENU_IDLE_TIMEOUT_MS)
+            events = pygame.event.get()
+            if first.type != pygame.NOEVENT:
+                events.insert(0, first)
+            self.clock.tick()
+        else:
+            if self.focused and not self.minimized:
+                self.mode, fps = "play", self.target_fps
+            else:
+                self.mode, fps = "background", UNFOCUSED_FPS
+            if self.busy_loop and self.mode == "play":
+                self.clock.tick_busy_loop(fps)
+            else:
+                self.clock.tick(fps)
+            events = pygame.event.get()
+        now = time.perf_counter()
+        dt = (now - self._last) * 1000.0
+        self._last = now
+        # los frames de reposo (o justo tras él) no cuentan para FPS/jitter
+        if self.mode != "idle" and prev_mode != "idle":
+            self.intervals.append(dt)
+        if self.mode == "idle":
+            # el tiempo dormido no es tiempo de juego (p. ej. al empezar partida desde el menú)
+            dt = 0.0
+        for event in events:
+            self.handle_event(event)
+        return dt, events
+
+    def max_frame_ms(self, step_ms):
+        """
+        Tope de tiempo a simular en un frame: MAX_SIM_STEPS pasos, o un frame
+        entero (con margen) a UNFOCUSED_FPS para que sin foco el juego no vaya
+        a cámara lenta
+        """
+        cap = step_ms * MAX_SIM_STEPS
+        if self.mode == "background":
+            cap = max(cap, 2000.0 / UNFOCUSED_FPS)
+        return cap
+
+    def stats(self):
+        """FPS conseguidos y jitter (desviación típica del intervalo entre frames, ms)"""
+        if not self.intervals:
+            return {"mode": self.mode, "target_fps": self.target_fps, "fps": 0.0,
+                    "frame_ms_mean": 0.0, "jitter_ms": 0.0, "frame_ms_p99": 0.0}
+        iv = np.fromiter(self.intervals, dtype=np.float64)
+        mean = float(iv.mean())
+        return {"mode": self.mode, "target_fps": self.target_fps,
+                "fps": round(1000.0 / mean, 2) if mean else 0.0,
+                "frame_ms_mean": round(mean, 3), "jitter_ms": round(float(iv.std()), 3),
+                "frame_ms_p99": round(float(np.percentile(iv, 99)), 3)}
+
+
+class ProfilerOverlay:
+    """Panel con percentiles por sección, contadores y gráfica de tiempo de frame"""
+    GRAPH_H = 60
+
+    def __init__(self, profiler, font, width=300, pacer=None):
+        self.profiler = profiler
+        self.pacer = pacer
+        self.font = font
+        self.glyphs = GlyphAtlas(font, (230, 230, 230))
+        self.width = width
+        self.panel = None
+        self.lines = []
+        self.refresh_every = 15  # frames entre recálculos de texto (ordenar es caro)
+        self._frames = 0
+
+    @property
+    def budget_ms(self):
+        """Presupuesto por frame según el objetivo del pacer (--fps); 0 = sin límite"""
+        fps = self.pacer.target_fps if self.pacer else RENDER_FPS
+        return 1000.0 / (fps if fps > 0 else RENDER_FPS)
+
+    def _rebuild(self):
+        prof = self.profiler
+        rows = []
+        if self.pacer:
+            st = self.pacer.stats()
+            rows.append(("ritmo", "obj", "fps", "jitter"))
+            rows.append((st["mode"], f"{st['target_fps']}", f"{st['fps']:.1f}", f"{st['jitter_ms']:.2f}"))
+        rows.append(("sección", "p50", "p95", "p99"))
+        sections = [n for n in prof.history if n not in PROFILE_COUNTERS]
+        sections.sort(key=lambda n: (n != "frame", -prof.percentiles(n, (95,))[0]))
+        for name in sections:
+            p50, p95, p99 = prof.percentiles(name)
+            rows.append((name, f"{p50:.2f}", f"{p95:.2f}", f"{p99:.2f}"))
+        for name in PROFILE_COUNTERS:
+            if name in prof.history:
+                p50, p95, p99 = prof.percentiles(name)
+                rows.append((name, f"{p50:.0f}", f"{p95:.0f}", f"{p99:.0f}"))
+        self.lines = rows
+        height = len(self.lines) * (self.font.get_linesize()) + self.GRAPH_H + 12
+        if self.panel is None or self.panel.get_height() != height:
+            self.panel = pygame.Surface((self.width, height), pygame.SRCALPHA).convert_alpha()
+
+    def draw(self, surf):
+        if self._frames % self.refresh_every == 0 or self.panel is None:
+            self._rebuild()
+        self._frames += 1
+        panel = self.panel
+        panel.fill((0, 0, 0, 170))
+        lh = self.font.get_linesize()
+        cols = (4, self.width - 180, self.width - 120, self.width - 60)
+        for i, row in enumerate(self.lines):
+            for x, txt in zip(cols, row):
+                self.glyphs.draw(panel, txt, (x, 4 + i * lh))
+
+        # gráfica de tiempo de frame (línea roja = presupuesto del FPS objetivo)
+        top = 8 + len(self.lines) * lh
+        frames = self.profiler.history.get("frame", ())
+        budget = self.budget_ms
+        scale = self.GRAPH_H / (budget * 2)
+        budget_y = top + self.GRAPH_H - int(budget * scale)
+        pygame.draw.line(panel, (255, 60, 60), (0, budget_y), (self.width, budget_y))
+        n = len(frames)
+        for i, ms in enumerate(frames):
+            x = self.width - n + i
+            if x < 0:
+                continue
+            h = min(self.GRAPH_H, int(ms * scale))
+            col = (120, 220, 120) if ms <= budget else (240, 200, 60)
+            pygame.draw.line(panel, col, (x, top + self.GRAPH_H), (x, top + self.GRAPH_H - h))
+        surf.blit(panel, (surf.get_width() - self.width - 8, 8))
+
+
+# -----------------------
+# Índice espacial (broadphase)
+# -----------------------
+class SpatialGrid:
+    """
+    Rejilla uniforme que indexa rects estáticos por celda.
+    query(rect) solo mira las celdas que toca el rect, así el coste no depende
+    del tamaño del mapa. Es iterable como la lista de rects original.
+    """
+    def __init__(self, rects, cell_w, cell_h):
+        self.rects = list(rects)
+        self.cell_w = max(1, int(cell_w))
+        self.cell_h = max(1, int(cell_h))
+        self.cells = {}  # (cx, cy) -> [índices en self.rects]
+        for i, r in enumerate(self.rects):
+            self._insert(i, r)
+
+    def _cell_range(self, rect):
+        # celdas cubiertas por el rect (right/bottom son exclusivos)
+        x0 = rect.left // self.cell_w
+        y0 = rect.top // self.cell_h
+        x1 = max(x0, (rect.right - 1) // self.cell_w)
+        y1 = max(y0, (rect.bottom - 1) // self.cell_h)
+        return x0, y0, x1, y1
+
+    def _insert(self, i, rect):
+        x0, y0, x1, y1 = self._cell_range(rect)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), []).append(i)
+
+    def query(self, rect):
+        """Devuelve los rects que se solapan con rect (en el orden original)"""
+        x0, y0, x1, y1 = self._cell_range(rect)
+        cells = self.cells
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        rects = self.rects
+        return [rects[i] for i in sorted(found) if rect.colliderect(rects[i])]
+
+    def __iter__(self):
+        return iter(self.rects)
+
+    def __len__(self):
+        return len(self.rects)
+
+    def sweep(self, rect, dx, dy):
+        """Primer rect que toca rect al moverse (dx, dy): (toi, normal, rect) o None"""
+        hit = sweep_grid(self, rect, dx, dy)
+        if hit is None:
+            return None
+        toi, normal, i = hit
+        return toi, normal, self.rects[i]
+
+
+class DynamicGrid:
+    """
+    Rejilla uniforme para objetos que se mueven. Cada clave (p. ej. el slot
+    de un enemigo) guarda una referencia a su rect y las celdas que ocupa;
+    update() solo la re-enlaza si cambió de celdas, así mantenerla al día
+    cuesta O(objetos que se movieron) por paso. query() devuelve
+    candidatos ya filtrados con colliderect.
+    """
+    def __init__(self, cell_size=ENTITY_GRID_CELL):
+        self.cell = self.cell_w = self.cell_h = max(1, int(cell_size))
+        self.cells = {}   # (cx, cy) -> set de claves
+        self.ranges = {}  # clave -> (x0, y0, x1, y1)
+        self.rects = {}   # clave -> rect
+
+    def _cell_range(self, rect):
+        c = self.cell
+        x0 = rect.left // c
+        y0 = rect.top // c
+        return x0, y0, max(x0, (rect.right - 1) // c), max(y0, (rect.bottom - 1) // c)
+
+    def _link(self, key, rng, add):
+        x0, y0, x1, y1 = rng
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                if add:
+                    cells.setdefault((cx, cy), set()).add(key)
+                else:
+                    bucket = cells[(cx, cy)]
+                    bucket.discard(key)
+                    if not bucket:
+                        del cells[(cx, cy)]
+
+    def update(self, key, rect):
+        """Inserta o mueve key; rect se guarda por referencia"""
+        self.rects[key] = rect
+        rng = self._cell_range(rect)
+        old = self.ranges.get(key)
+        if old == rng:
+            return
+        if old is not None:
+            self._link(key, old, False)
+        self._link(key, rng, True)
+        self.ranges[key] = rng
+
+    def remove(self, key):
+        rng = self.ranges.pop(key, None)
+        if rng is not None:
+            self._link(key, rng, False)
+            del self.rects[key]
+
+    def query(self, rect):
+        """Claves cuyo rect se solapa con rect, ordenadas"""
+        x0, y0, x1, y1 = self._cell_range(rect)
+        cells = self.cells
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found |= bucket
+        rects = self.rects
+        return [k for k in sorted(found) if rect.colliderect(rects[k])]
+
+    def sweep(self, rect, dx, dy):
+        """Primera clave que toca rect al moverse (dx, dy): (toi, normal, clave) o None"""
+        return sweep_grid(self, rect, dx, dy)
+
+    def __len__(self):
+        return len(self.ranges)
+
+
+def sweep_aabb(rect, dx, dy, other):
+    """
+    Barrido de rect moviéndose (dx, dy) contra other (quieto).
+    Devuelve (toi, (nx, ny)): toi en [0, 1) es la fracción del movimiento en
+    la que empiezan a solaparse y (nx, ny) la normal de la cara tocada
+    (apunta hacia rect). Si ya se solapaban al inicio: (0.0, (0, 0)).
+    None si no llegan a solaparse.
+    """
+    if dx > 0:
+        tx0, tx1 = (other.left - rect.right) / dx, (other.right - rect.left) / dx
+    elif dx < 0:
+        tx0, tx1 = (other.right - rect.left) / dx, (other.left - rect.right) / dx
+    elif rect.right > other.left and rect.left < other.right:
+        tx0, tx1 = -math.inf, math.inf
+    else:
+        return None
+    if dy > 0:
+        ty0, ty1 = (other.top - rect.bottom) / dy, (other.bottom - rect.top) / dy
+    elif dy < 0:
+        ty0, ty1 = (other.bottom - rect.top) / dy, (other.top - rect.bottom) / dy
+    elif rect.bottom > other.top and rect.top < other.bottom:
+        ty0, ty1 = -math.inf, math.inf
+    else:
+        return None
+    entry = max(tx0, ty0)
+    leave = min(tx1, ty1)
+    if entry >= leave or entry >= 1.0 or leave <= 0.0:
+        return None
+    if entry < 0.0:
+        return 0.0, (0, 0)
+    if tx0 > ty0:
+        return entry, (-1 if dx > 0 else 1, 0)
+    return entry, (0, -1 if dy > 0 else 1)
+
+
+def sweep_grid(grid, rect, dx, dy):
+    """
+    Colisión continua contra una rejilla (SpatialGrid o DynamicGrid): recorre
+    con DDA las celdas que va ocupando rect al moverse (dx, dy), en orden de
+    tiempo, y para en cuanto el mejor impacto es anterior a la siguiente
+    celda. Devuelve (toi, normal, clave) del primer impacto o None.
+    """
+    cw, ch = grid.cell_w, grid.cell_h
+    cells, rects = grid.cells, grid.rects
+    # instante (0..1) del próximo cruce de línea de la rejilla por el borde delantero
+    if dx > 0:
+        tx, tdx = ((rect.right // cw + 1) * cw - rect.right) / dx, cw / dx
+    elif dx < 0:
+        tx, tdx = (rect.left - (rect.left // cw) * cw) / -dx, cw / -dx
+    else:
+        tx = tdx = math.inf
+    if dy > 0:
+        ty, tdy = ((rect.bottom // ch + 1) * ch - rect.bottom) / dy, ch / dy
+    elif dy < 0:
+        ty, tdy = (rect.top - (rect.top // ch) * ch) / -dy, ch / -dy
+    else:
+        ty = tdy = math.inf
+
+    best = None
+    seen = set()
+    t = 0.0
+    while True:
+        t_next = min(tx, ty, 1.0)
+        # celdas que ocupa el rect durante [t, t_next]
+        xa, xb = sorted((rect.left + dx * t, rect.left + dx * t_next))
+        ya, yb = sorted((rect.top + dy * t, rect.top + dy * t_next))
+        x0 = int(xa // cw)
+        y0 = int(ya // ch)
+        x1 = max(x0, int((math.ceil(xb + rect.w) - 1) // cw))
+        y1 = max(y0, int((math.ceil(yb + rect.h) - 1) // ch))
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if not bucket:
+                    continue
+                for key in bucket:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    hit = sweep_aabb(rect, dx, dy, rects[key])
+                    if hit and (best is None or (hit[0], key) < (best[0], best[2])):
+                        best = (hit[0], hit[1], key)
+        # lo que quede por visitar no puede tocarse antes de t_next
+        if t_next >= 1.0 or (best is not None and best[0] <= t_next):
+            return best
+        t = t_next
+        if tx <= ty:
+            tx += tdx
+        else:
+            ty += tdy
+
+
+# -----------------------
+# Caché de tiles por chunks
+# -----------------------
+class TileChunkCache:
+    """
+    Pre-renderiza las capas de tiles en superficies grandes (chunks) la primera
+    vez que entran en cámara, para blitear unos pocos chunks por frame en vez
+    de cientos de tiles. Las capas de tiles consecutivas se hornean juntas; las
+    capas de imagen se siguen dibujando en su orden. LRU con límite de memoria.
+    """
+    def __init__(self, tmx, chunk_size=TILE_CHUNK_SIZE, max_mb=TILE_CACHE_MAX_MB,
+                 evict_dist=TILE_CHUNK_EVICT_DIST):
+        self.tmx = tmx
+        self.tw, self.th = tmx.tilewidth, tmx.tileheight
+        # chunk como múltiplo exacto del tamaño de tile
+        self.chunk_cols = max(1, chunk_size // self.tw)
+        self.chunk_rows = max(1, chunk_size // self.th)
+        self.chunk_w = self.chunk_cols * self.tw
+        self.chunk_h = self.chunk_rows * self.th
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.evict_dist = evict_dist
+        self.chunks = OrderedDict()  # (grupo, cx, cy) -> Surface o None si está vacío
+        self.bytes_used = 0
+
+        # lista de dibujo: ("tiles", [capas]) o ("image", capa)
+        self.draw_list = []
+        for layer in tmx.visible_layers:
+            if isinstance(layer, (pytmx.TiledTileLayer, CachedTileLayer)):
+                if self.draw_list and self.draw_list[-1][0] == "tiles":
+                    self.draw_list[-1][1].append(layer)
+                else:
+                    self.draw_list.append(("tiles", [layer]))
+            elif isinstance(layer, (pytmx.TiledImageLayer, CachedImageLayer)):
+                self.draw_list.append(("image", layer))
+
+    def _build_chunk(self, layers, cx, cy):
+        tx0, ty0 = cx * self.chunk_cols, cy * self.chunk_rows
+        tx1 = min(self.tmx.width, tx0 + self.chunk_cols)
+        ty1 = min(self.tmx.height, ty0 + self.chunk_rows)
+        surf = None
+        for layer in layers:
+            data = layer.data
+            for y in range(ty0, ty1):
+                row = data[y]
+                for x in range(tx0, tx1):
+                    gid = row[x]
+                    if not gid:
+                        continue
+                    tile = self.tmx.get_tile_image_by_gid(gid)
+                    if not tile:
+                        continue
+                    if surf is None:
+                        size = ((tx1 - tx0) * self.tw, (ty1 - ty0) * self.th)
+                        surf = pygame.Surface(size, pygame.SRCALPHA).convert_alpha()
+                        surf.fill((0, 0, 0, 0))
+                    surf.blit(tile, ((x - tx0) * self.tw, (y - ty0) * self.th))
+        return surf
+
+    def _get(self, group, layers, cx, cy):
+        key = (group, cx, cy)
+        if key in self.chunks:
+            self.chunks.move_to_end(key)
+            return self.chunks[key]
+        surf = self._build_chunk(layers, cx, cy)
+        self.chunks[key] = surf
+        if surf is not None:
+            self.bytes_used += surf.get_bytesize() * surf.get_width() * surf.get_height()
+        return surf
+
+    def _evict(self, cam_cx0, cam_cy0, cam_cx1, cam_cy1):
+        # liberar chunks lejos de la cámara y, si aún se excede el límite, los menos usados
+        d = self.evict_dist
+        for key in list(self.chunks):
+            _, cx, cy = key
+            if cx < cam_cx0 - d or cx > cam_cx1 + d or cy < cam_cy0 - d or cy > cam_cy1 + d:
+                self._drop(key)
+        while self.bytes_used > self.max_bytes and len(self.chunks) > 1:
+            self._drop(next(iter(self.chunks)))
+
+    def _drop(self, key):
+        surf = self.chunks.pop(key)
+        if surf is not None:
+            self.bytes_used -= surf.get_bytesize() * surf.get_width() * surf.get_height()
+
+    def draw(self, surf, view):
+        """Dibuja las capas visibles dentro de view (pygame.Rect en coords de mundo)"""
+        cx0 = max(0, view.left // self.chunk_w)
+        cy0 = max(0, view.top // self.chunk_h)
+        cx1 = min((self.tmx.width - 1) // self.chunk_cols, (view.right - 1) // self.chunk_w)
+        cy1 = min((self.tmx.height - 1) // self.chunk_rows, (view.bottom - 1) // self.chunk_h)
+        built = len(self.chunks)
+
+        blits = 0
+        for group, (kind, item) in enumerate(self.draw_list):
+            if kind == "tiles":
+                for cx in range(cx0, cx1 + 1):
+                    for cy in range(cy0, cy1 + 1):
+                        chunk = self._get(group, item, cx, cy)
+                        if chunk is not None:
+                            surf.blit(chunk, (cx * self.chunk_w - view.x, cy * self.chunk_h - view.y))
+                            blits += 1
+            elif item.image:
+                sx = getattr(item, "offsetx", 0) - view.x
+                sy = getattr(item, "offsety", 0) - view.y
+                surf.blit(item.image, (sx, sy))
+                blits += 1
+
+        # solo revisamos la caché cuando se ha horneado algo nuevo
+        if len(self.chunks) != built:
+            self._evict(cx0, cy0, cx1, cy1)
+        return blits
+
+
+# -----------------------
+# Carga de niveles
+# -----------------------
+def deferred_image_loader(filename, colorkey, records=None, **kwargs):
+    """
+    Cargador de imágenes para pytmx que no convierte al formato de pantalla,
+    así el TMX se puede parsear fuera del hilo principal.
+    La conversión se hace después con convert_tmx_images.
+    records (dict opcional): id(superficie) -> (archivo, colorkey, rect, flags),
+    para poder guardar el mapa en la caché binaria.
+    """
+    colorkey_str = colorkey or ""
+    if colorkey:
+        colorkey = pygame.Color("#{0}".format(colorkey))
+    image = pygame.image.load(filename)
+
+    def load(rect=None, flags=None):
+        tile = image.subsurface(rect) if rect else image.copy()
+        if flags:
+            tile = pytmx.util_pygame.handle_transformation(tile, flags)
+        if colorkey:
+            tile = tile.copy()
+            tile.set_colorkey(colorkey)
+        if records is not None:
+            records[id(tile)] = (str(filename), colorkey_str, rect, flags)
+        return tile
+
+    return load
+
+def convert_tmx_images(tmx):
+    """Convierte (en el hilo principal) las imágenes cargadas con deferred_image_loader"""
+    # las capas de imagen apuntan a tmx.images por gid, así que basta con convertir la lista
+    for i, img in enumerate(tmx.images):
+        if img is not None:
+            tmx.images[i] = img.convert() if img.get_colorkey() else img.convert_alpha()
+
+
+# -----------------------
+# Caché binaria de niveles
+# -----------------------
+class CachedTileLayer:
+    """Capa de tiles leída de la caché (data[y][x] como en pytmx)"""
+    def __init__(self, name, visible, data):
+        self.name = name
+        self.visible = visible
+        self.data = data
+
+
+class CachedImageLayer:
+    """Capa de imagen leída de la caché; la imagen vive en parent.images como en pytmx"""
+    def __init__(self, parent, name, visible, gid, offsetx, offsety):
+        self.parent = parent
+        self.name = name
+        self.visible = visible
+        self.gid = gid
+        self.offsetx = offsetx
+        self.offsety = offsety
+
+    @property
+    def image(self):
+        return self.parent.images[self.gid] if self.gid >= 0 else None
+
+
+class CachedMap:
+    """Sustituto ligero de pytmx.TiledMap con lo que usa el juego para dibujar"""
+    def __init__(self, width, height, tilewidth, tileheight, buffer=None):
+        self.width = width
+        self.height = height
+        self.tilewidth = tilewidth
+        self.tileheight = tileheight
+        self.images = []
+        self.layers = []
+        self.objects = []
+        self._buffer = buffer  # mmap que respalda los datos de las capas
+
+    @property
+    def visible_layers(self):
+        return [layer for layer in self.layers if layer.visible]
+
+    def get_tile_image_by_gid(self, gid):
+        return self.images[gid]
+
+
+class _CacheWriter:
+    def __init__(self):
+        self.buf = bytearray()
+
+    def pack(self, fmt, *values):
+        self.buf += struct.pack("<" + fmt, *values)
+
+    def text(self, s):
+        raw = s.encode("utf-8")
+        self.pack("I", len(raw))
+        self.buf += raw
+
+    def array(self, arr):
+        # alinear a 4 bytes para poder hacer cast del memoryview al leer
+        self.buf += bytes(-len(self.buf) % 4)
+        self.pack("cI", arr.typecode.encode(), len(arr))
+        self.buf += arr.tobytes()
+
+    def ndarray(self, arr):
+        # igual que array() para arrays de NumPy (el dtype lo conoce quien lee)
+        self.buf += bytes(-len(self.buf) % 8)
+        self.pack("I", arr.size)
+        self.buf += np.ascontiguousarray(arr).tobytes()
+
+
+class _CacheReader:
+    def __init__(self, buf):
+        self.mv = memoryview(buf)
+        self.pos = 0
+
+    def unpack(self, fmt):
+        fmt = "<" + fmt
+        values = struct.unpack_from(fmt, self.mv, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def text(self):
+        (n,) = self.unpack("I")
+        s = bytes(self.mv[self.pos:self.pos + n]).decode("utf-8")
+        self.pos += n
+        return s
+
+    def array(self):
+        """memoryview (sin copia) sobre los datos del array"""
+        self.pos += -self.pos % 4
+        code, n = self.unpack("cI")
+        code = code.decode()
+        size = n * array.array(code).itemsize
+        view = self.mv[self.pos:self.pos + size].cast(code)
+        self.pos += size
+        return view
+
+    def ndarray(self, out):
+        """Copia en out (array de NumPy ya creado) los datos escritos con ndarray()"""
+        self.pos += -self.pos % 8
+        (n,) = self.unpack("I")
+        if n != out.size:
+            raise ValueError(f"tamaño {n} distinto del esperado {out.size}")
+        np.copyto(out, np.frombuffer(self.mv, dtype=out.dtype, count=n, offset=self.pos))
+        self.pos += n * out.itemsize
+
+
+def _level_cache_path(map_path):
+    # el hash de la ruta evita choques entre mapas con el mismo nombre en carpetas distintas
+    tag = hashlib.sha1(str(Path(map_path).resolve()).encode("utf-8")).hexdigest()[:8]
+    return LEVEL_CACHE_DIR / f"{Path(map_path).stem}-{tag}.rwl"
+
+def _level_cache_options():
+    """Opciones que cambian la geometría guardada (bits): se comparan siempre"""
+    return int(MERGE_COLLISION_RECTS)
+
+def _level_cache_deps(map_path):
+    """El TMX y los tilesets externos (.tsx) que referencia, en orden"""
+    map_path = Path(map_path)
+    deps = [map_path]
+    for ts in ElementTree.parse(map_path).getroot().iter("tileset"):
+        if ts.get("source"):
+            deps.append(map_path.parent / ts.get("source"))
+    return deps
+
+def _file_stamp(path):
+    """(mtime_ns, tamaño) o (-1, -1) si el archivo ya no existe"""
+    try:
+        st = Path(path).stat()
+    except OSError:
+        return -1, -1
+    return st.st_mtime_ns, st.st_size
+
+def _level_cache_digest(deps):
+    """sha1 del contenido de todas las dependencias (qué tilesets se usan ya va en el TMX)"""
+    h = hashlib.sha1()
+    for dep in deps:
+        raw = Path(dep).read_bytes()
+        h.update(struct.pack("<Q", len(raw)))
+        h.update(raw)
+    return h.digest()
+
+def save_level_cache(level, records):
+    """Serializa la parte estática de un nivel parseado desde XML"""
+    tmx = level.tmx
+    w = _CacheWriter()
+    deps = _level_cache_deps(level.path)
+    w.buf += LEVEL_CACHE_MAGIC
+    w.pack("HBB", LEVEL_CACHE_VERSION, sys.byteorder == "little", _level_cache_options())
+    # dependencias con su fecha/tamaño (comprobación barata) y el sha1 de todas
+    w.pack("I", len(deps))
+    for dep in deps:
+        w.text(str(Path(dep).resolve()))
+        w.pack("qq", *_file_stamp(dep))
+    w.pack("20s", _level_cache_digest(deps))
+    w.pack("IIII", tmx.width, tmx.height, tmx.tilewidth, tmx.tileheight)
+
+    # imágenes por gid: referencias al atlas del tileset (archivo + rect + flips)
+    sources = []
+    entries = []
+    for img in tmx.images:
+        rec = records.get(id(img)) if img is not None else None
+        if rec is None:
+            entries.append((-1, 0, 0, -1, -1, 0))
+            continue
+        filename, colorkey, rect, flags = rec
+        src = (filename, colorkey)
+        if src not in sources:
+            sources.append(src)
+        bits = 0
+        if flags:
+            bits = (flags.flipped_horizontally * 1) | (flags.flipped_vertically * 2) | (flags.flipped_diagonally * 4)
+        x, y, rw, rh = rect if rect else (0, 0, -1, -1)
+        entries.append((sources.index(src), x, y, rw, rh, bits))
+    w.pack("I", len(sources))
+    for filename, colorkey in sources:
+        w.text(filename)
+        w.text(colorkey)
+    w.pack("I", len(entries))
+    for entry in entries:
+        w.pack("iiiiiB", *entry)
+
+    # capas en orden
+    layers = [l for l in tmx.layers if isinstance(l, (pytmx.TiledTileLayer, pytmx.TiledImageLayer))]
+    w.pack("I", len(layers))
+    for layer in layers:
+        visible = bool(getattr(layer, "visible", True))
+        if isinstance(layer, pytmx.TiledTileLayer):
+            w.pack("BB", 0, visible)
+            w.text(layer.name or "")
+            flat = [gid for row in layer.data for gid in row]
+            w.array(array.array("H" if max(flat, default=0) < 65536 else "I", flat))
+        else:
+            w.pack("BB", 1, visible)
+            w.text(layer.name or "")
+            gid = getattr(layer, "gid", None)
+            w.pack("idd", gid if gid else -1, getattr(layer, "offsetx", 0) or 0, getattr(layer, "offsety", 0) or 0)
+
+    # colisiones ya fusionadas, spawn y enemigos con sus rutas
+    w.array(array.array("i", [v for r in level.collision_rects for v in (r.x, r.y, r.w, r.h)]))
+    w.pack("dd", *level.spawn)
+    w.pack("I", len(level.enemy_specs))
+    for kind, x, y, path in level.enemy_specs:
+        w.text(kind)
+        w.pack("dd", x, y)
+        w.array(array.array("d", [v for p in path for v in p]))
+
+    LEVEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    dest = _level_cache_path(level.path)
+    tmp = dest.with_suffix(".tmp")
+    tmp.write_bytes(bytes(w.buf))
+    os.replace(tmp, dest)
+
+def load_level_cache(map_path):
+    """LevelData leído (con mmap) de la caché, o None si no existe o está desactualizada"""
+    path = _level_cache_path(map_path)
+    if not path.exists():
+        return None
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    r = _CacheReader(mm)
+    level = None
+    try:
+        level = _read_level_cache(r, mm, map_path)
+    finally:
+        if level is None:
+            # desactualizada o corrupta: soltar la vista antes de cerrar el mmap
+            # (con buffers exportados close() falla; si quedan vistas vivas en un
+            # traceback, lo cierra el GC)
+            r.mv.release()
+            try:
+                mm.close()
+            except BufferError:
+                pass
+    return level
+
+
+def _read_level_cache(r, mm, map_path):
+    """Cuerpo de load_level_cache: None si la caché no corresponde a map_path"""
+    if bytes(r.mv[:len(LEVEL_CACHE_MAGIC)]) != LEVEL_CACHE_MAGIC:
+        return None
+    r.pos = len(LEVEL_CACHE_MAGIC)
+    version, little, options = r.unpack("HBB")
+    if version != LEVEL_CACHE_VERSION or bool(little) != (sys.byteorder == "little"):
+        return None
+    if options != _level_cache_options():
+        return None
+    stale = False
+    for _ in range(r.unpack("I")[0]):
+        dep = r.text()
+        stale |= r.unpack("qq") != _file_stamp(dep)
+    (digest,) = r.unpack("20s")
+    if stale:
+        # alguna fecha cambió: solo es válida si el contenido es el mismo
+        if _level_cache_digest(_level_cache_deps(map_path)) != digest:
+            return None
+
+    width, height, tw, th = r.unpack("IIII")
+    tmx = CachedMap(width, height, tw, th, buffer=mm)
+
+    sources = []
+    for _ in range(r.unpack("I")[0]):
+        filename = r.text()
+        sources.append((filename, r.text()))
+    loaders = {}
+    for _ in range(r.unpack("I")[0]):
+        src, x, y, rw, rh, bits = r.unpack("iiiiiB")
+        if src < 0:
+            tmx.images.append(None)
+            continue
+        if src not in loaders:
+            loaders[src] = deferred_image_loader(*sources[src])
+        flags = pytmx.TileFlags(bool(bits & 1), bool(bits & 2), bool(bits & 4))
+        rect = (x, y, rw, rh) if rw >= 0 else None
+        tmx.images.append(loaders[src](rect, flags))
+
+    for _ in range(r.unpack("I")[0]):
+        kind, visible = r.unpack("BB")
+        name = r.text()
+        if kind == 0:
+            flat = r.array()
+            rows = [flat[y * width:(y + 1) * width] for y in range(height)]
+            tmx.layers.append(CachedTileLayer(name, bool(visible), rows))
+        else:
+            gid, ox, oy = r.unpack("idd")
+            tmx.layers.append(CachedImageLayer(tmx, name, bool(visible), gid, ox, oy))
+
+    level = LevelData(map_path)
+    level.tmx = tmx
+    flat = r.array()
+    rects = [pygame.Rect(flat[i], flat[i + 1], flat[i + 2], flat[i + 3]) for i in range(0, len(flat), 4)]
+    level.collision_rects = SpatialGrid(rects, tw, th)
+    level.spawn = r.unpack("dd")
+    for _ in range(r.unpack("I")[0]):
+        kind = r.text()
+        x, y = r.unpack("dd")
+        pts = r.array()
+        level.enemy_specs.append((kind, x, y, [(pts[i], pts[i + 1]) for i in range(0, len(pts), 2)]))
+    level.from_cache = True
+    return level
+
+
+class LevelData:
+    """Todo lo necesario para activar un mapa, preparado sin tocar la pantalla"""
+    def __init__(self, path):
+        self.path = path
+        self.tmx = None
+        self.collision_rects = None
+        self.spawn = (100, 100)
+        self.enemy_specs = []
+        self.bg_raw = None       # fondo sin convertir
+        self.prepare_ms = 0.0
+        self.from_cache = False
+        self.converted = False   # imágenes del tmx ya en formato de pantalla
+
+
+class LevelLoader:
+    """Prepara un LevelData en un hilo de fondo; take() lo recoge (esperando si hace falta)"""
+    def __init__(self):
+        self.job = None  # {"path", "thread", "result", "error"} del trabajo en curso
+
+    def start(self, path, prepare):
+        """Lanza la preparación de path (no hace nada si ya está en marcha)"""
+        if self.job and self.job["path"] == path:
+            return
+        job = {"path": path, "thread": None, "result": None, "error": None}
+
+        def work():
+            try:
+                job["result"] = prepare(path)
+            except Exception as e:
+                job["error"] = e
+
+        job["thread"] = threading.Thread(target=work, name=f"load-{path.stem}", daemon=True)
+        self.job = job
+        job["thread"].start()
+
+    def take(self, path):
+        """Devuelve el nivel preparado para path, o None si no se pidió (se cargará en síncrono)"""
+        job = self.job
+        if not job or job["path"] != path:
+            return None
+        self.job = None
+        t0 = time.perf_counter()
+        job["thread"].join()
+        wait_ms = (time.perf_counter() - t0) * 1000.0
+        if wait_ms > 1.0:
+            log(f"Esperando carga de {path.stem}: {wait_ms:.1f} ms")
+        if job["error"]:
+            log(f"Error preparando {path.stem}: {job['error']}")
+            return None
+        return job["result"]
+
+
+# -----------------------
+# Superficies de render reutilizables
+# -----------------------
+class RenderTargets:
+    """
+    Mantiene las superficies intermedias del render para no crear ninguna
+    por frame: la superficie de cámara (una por tamaño de cámara), el destino
+    del escalado a ventana y los fondos ya escalados al tamaño de la ventana.
+    """
+    def __init__(self, screen):
+        self.screen = screen
+        self.cam_surface = None
+        self.scaled_dest = None
+        self._scaled = {}  # (id(img), tamaño) -> (img, copia escalada)
+
+    def camera_surface(self, size):
+        """Superficie transparente del tamaño de la cámara (se reasigna solo si cambia el tamaño)"""
+        if self.cam_surface is None or self.cam_surface.get_size() != size:
+            self.cam_surface = pygame.Surface(size, pygame.SRCALPHA).convert_alpha()
+            self.scaled_dest = None
+        self.cam_surface.fill((0, 0, 0, 0))
+        return self.cam_surface
+
+    def scaled(self, image, size):
+        """Copia de image escalada a size, calculada una sola vez"""
+        key = (id(image), size)
+        entry = self._scaled.get(key)
+        if entry is None or entry[0] is not image:
+            entry = (image, pygame.transform.scale(image, size))
+            self._scaled[key] = entry
+        return entry[1]
+
+    def present(self, cam_surface):
+        """Vuelca la superficie de cámara a pantalla, escalando solo si hace falta"""
+        size = self.screen.get_size()
+        if cam_surface.get_size() == size:
+            self.screen.blit(cam_surface, (0, 0))
+            return
+        if self.scaled_dest is None:
+            # mismo formato que la superficie de cámara (requisito de transform.scale)
+            self.scaled_dest = pygame.Surface(size, pygame.SRCALPHA).convert_alpha()
+        pygame.transform.scale(cam_surface, size, self.scaled_dest)
+        self.screen.blit(self.scaled_dest, (0, 0))
+
+    def clear(self):
+        """Olvida los fondos escalados (p. ej. al cambiar de mapa)"""
+        self._scaled.clear()
+
+
+class DirtyRects:
+    """
+    Decide qué se vuelca a la ventana cada frame. Quien dibuja marca las
+    regiones cambiadas con add() (en coordenadas de pantalla) o pide un
+    volcado completo con invalidate() (cámara en movimiento, cambio de
+    estado, ventana expuesta...). present() usa display.update(rects) con
+    las regiones de este frame más las del anterior (para borrar lo que se
+    movió) y no hace nada si no cambió nada. Desactivado, siempre hace flip.
+    """
+    def __init__(self, enabled=DIRTY_RECTS and not HEADLESS):
+        self.enabled = enabled
+        self.full = True
+        self.rects = []
+        self.prev = []
+
+    def invalidate(self):
+        self.full = True
+
+    def add(self, rect):
+        # también en frames completos: el siguiente los necesita para borrar
+        if self.enabled:
+            self.rects.append(pygame.Rect(rect))
+
+    def present(self):
+        """Vuelca a la ventana; devuelve cuántas regiones se enviaron (1 = pantalla completa)"""
+        if self.full or not self.enabled:
+            pygame.display.flip()
+            pushed = 1
+        else:
+            rects = self.rects + self.prev
+            if rects:
+                pygame.display.update(rects)
+            pushed = len(rects)
+        self.full = not self.enabled
+        self.prev = self.rects
+        self.rects = []
+        return pushed
+
+
+def interp_pos(entity, alpha):
+    """Posición de dibujo entre prev_pos (paso anterior) y rect.topleft (paso actual)"""
+    x, y = entity.rect.topleft
+    px, py = entity.prev_pos
+    if abs(x - px) > INTERP_SNAP_DIST or abs(y - py) > INTERP_SNAP_DIST:
+        return x, y
+    return round(px + (x - px) * alpha), round(py + (y - py) * alpha)
+
+
 # -----------------------
 # Clases principales
 # -----------------------
@@ -57,6 +1727,21 @@ class Camera:
         cam_w = min(screen_w // zoom, max(1, world_w))
         cam_h = min(screen_h // zoom, max(1, world_h))
         self.rect = pygame.Rect(0, 0, cam_w, cam_h)
+        # rect interpolado que se usa para dibujar (ver interpolate)
+        self.view = self.rect.copy()
+        self.prev_pos = self.rect.topleft
+
+    def interpolate(self, alpha):
+        """Coloca view entre la posición del paso anterior y la actual"""
+        self.view.topleft = interp_pos(self, alpha)
+
+    def save_state(self, w):
+        w.pack("4i", *self.rect.topleft, *self.prev_pos)
+
+    def load_state(self, r):
+        x, y, px, py = r.unpack("4i")
+        self.rect.topleft = (x, y)
+        self.prev_pos = (px, py)
 
     def update(self, target_rect):
         # centrar en el jugador
@@ -73,14 +1758,15 @@ class Player:
         self.start_pos = (x, y)
 
         # sprites (placeholders)
-        self.sprite_idle = load_image(ASSET_DIR/"borrador_robot.png")
-        self.sprite_attack = load_image(ASSET_DIR/"animations/attack/atk1.png")
+        self.sprite_idle = ASSETS.image(ASSET_DIR/"borrador_robot.png")
+        self.sprite_attack = ASSETS.image(ASSET_DIR/"animations/attack/atk1.png")
 
         self.image = self.sprite_idle
         self.rect = self.image.get_rect(topleft=(x, y))
 
         # posición como float para física suave
         self.pos = pygame.Vector2(float(self.rect.x), float(self.rect.y))
+        self.prev_pos = self.rect.topleft  # posición del paso anterior (interpolación)
         self.vel_x = 0.0
         self.vel_y = 0.0
 
@@ -93,36 +1779,21 @@ class Player:
         self.is_jumping = False   # 🔹 flag de si está en animación de salto
         self.image = self.sprite_idle
         self.rect = self.image.get_rect(topleft=(x, y))
+        self.prev_pos = self.rect.topleft
         self.direction = 1  # 1 derecha, -1 izquierda
 
-        # animaciones
-        self.frames_idle = [
-            load_image(ASSET_DIR/"animations/idle/de_pie1.png"),
-            load_image(ASSET_DIR/"animations/idle/de_pie2.png"),
-        ]
-        self.frames_run = [
-            load_image(ASSET_DIR/"animations/running/corriendo1.png"),
-            load_image(ASSET_DIR/"animations/running/corriendo2.png"),
-        ]
-        self.frames_jump = [
-            load_image(ASSET_DIR/"animations/jump/jump1.png"),
-            load_image(ASSET_DIR/"animations/jump/jump2.png"),
-            load_image(ASSET_DIR/"animations/jump/jump3.png"),
-            load_image(ASSET_DIR/"animations/jump/jump4.png"),
-        ]
-        self.frames_attack = [
-            load_image(ASSET_DIR/"animations/attack/atack1.png"),
-            load_image(ASSET_DIR/"animations/attack/atack2.png"),
-            load_image(ASSET_DIR/"animations/attack/atack3.png"),
-            load_image(ASSET_DIR/"animations/attack/atack4.png"),
-            load_image(ASSET_DIR/"animations/attack/atack5.png"),
-            load_image(ASSET_DIR/"animations/attack/atack6.png"),
-            load_image(ASSET_DIR/"animations/attack/atack7.png"),
-            load_image(ASSET_DIR/"animations/attack/atack8.png"),
-            load_image(ASSET_DIR/"animations/attack/atack9.png"),
-            load_image(ASSET_DIR/"animations/attack/atack10.png"),
-            load_image(ASSET_DIR/"animations/attack/atack11.png"),
-        ]
+        # animaciones (compartidas y ya volteadas): {1: derecha, -1: izquierda}
+        self.frames_idle = self._anim("player_idle")
+        self.frames_run = self._anim("player_run")
+        self.frames_jump = self._anim("player_jump")
+        self.frames_attack = self._anim("player_attack")
+        # todas las imágenes posibles: en una instantánea la imagen actual va como índice
+        self.images = [self.sprite_idle, self.sprite_attack] + [
+            img for anim in (self.frames_idle, self.frames_run, self.frames_jump, self.frames_attack)
+            for d in (1, -1) for img in anim[d]]
+        self.image_index = {}
+        for i, img in enumerate(self.images):
+            self.image_index.setdefault(id(img), i)
 
         self.frame_idx = 0.0
         self.frame_speed = 8.0
@@ -136,6 +1807,9 @@ class Player:
         self.attack_delay_timer = 0.0
         self.attack_requested = False
 
+    @staticmethod
+    def _anim(name):
+        return {1: ASSETS.frames(name, 1), -1: ASSETS.frames(name, -1)}
 
     def update(self, dt, keys, collision_rects):
         dt_s = dt / 1000.0
@@ -156,23 +1830,22 @@ class Player:
             self.on_ground = False
             self.is_jumping = True   # 🔹 ahora sí marcamos que está en salto
             self.frame_idx = 0.0     # reiniciar anim de salto
-            if hasattr(self, 'sound_jump') and self.sound_jump:
-                pygame.mixer.Sound.play(self.sound_jump)
+            AUDIO.play("jump")
 
 
         #  gravedad
         self.vel_y += self.gravity * dt_s
 
-        # movimiento X
+        # movimiento X (barrido continuo: a mucha velocidad no atraviesa muros finos)
         self.pos.x += self.vel_x * dt_s
-        self.rect.x = int(self.pos.x)
+        self._sweep_axis(collision_rects, int(self.pos.x) - self.rect.x, 0)
         self._collide_axis(collision_rects, axis="x")
 
         # movimiento Y
         prev_bottom = self.rect.bottom
         self.pos.y += self.vel_y * dt_s
-        self.rect.y = int(self.pos.y)
         self.on_ground = False
+        self._sweep_axis(collision_rects, 0, int(self.pos.y) - self.rect.y)
         self._collide_axis(collision_rects, axis="y", prev_bottom=prev_bottom)
 
         # 🔹 si aterrizó, se cancela animación de salto
@@ -183,29 +1856,27 @@ class Player:
         # Animaciones
         # ---------------------
 
+        # los frames ya vienen volteados según la dirección
         if self.is_jumping:
             # animación de salto (frames 0-2 al inicio, frame 3 en el aire)
-            if self.frame_idx < len(self.frames_jump) - 1:
+            frames = self.frames_jump[self.direction]
+            if self.frame_idx < len(frames) - 1:
                 self.frame_idx += self.frame_speed * dt_s
-                idx = min(int(self.frame_idx), len(self.frames_jump)-2)  # 0..2
+                idx = min(int(self.frame_idx), len(frames)-2)  # 0..2
             else:
-                idx = len(self.frames_jump) - 1  # último frame fijo
-            self.image = self.frames_jump[idx]
+                idx = len(frames) - 1  # último frame fijo
+            self.image = frames[idx]
 
         elif self.vel_x != 0 and self.on_ground:
             self.frame_idx += self.frame_speed * dt_s
-            frames = self.frames_run if self.frames_run else [self.sprite_idle]
+            frames = self.frames_run[self.direction] or [self.sprite_idle]
             self.image = frames[int(self.frame_idx) % len(frames)]
 
         else:
             self.frame_idx += self.frame_speed * dt_s
-            frames = self.frames_idle if self.frames_idle else [self.sprite_idle]
+            frames = self.frames_idle[self.direction] or [self.sprite_idle]
             self.image = frames[int(self.frame_idx) % len(frames)]
 
-        # dirección
-        if self.direction == -1:
-            self.image = pygame.transform.flip(self.image, True, False)
-
         # cooldown ataque
         if self.attack_timer > 0.0:
             self.attack_timer = max(0.0, self.attack_timer - dt_s)
@@ -214,26 +1885,54 @@ class Player:
         if self.is_attacking:
             self.frame_idx += self.frame_speed * dt_s
             idx = int(self.frame_idx)
-            if idx >= len(self.frames_attack):
+            frames = self.frames_attack[self.direction]
+            if idx >= len(frames):
                 # animación terminó
                 self.is_attacking = False
                 self.frame_idx = 0.0
-                self.image = self.frames_idle[0]
+                self.image = self.frames_idle[self.direction][0]
             else:
-                img = self.frames_attack[idx]
-                # 🔹 flip solo si está mirando a la izquierda
-                if self.direction == -1:
-                    img = pygame.transform.flip(img, True, False)
-                self.image = img
+                self.image = frames[idx]
 
 
+    def _sweep_axis(self, rects, dx, dy):
+        """
+        Mueve el rect (dx, dy) px parando en el primer contacto con la
+        geometría. Si ya se solapaba al empezar, se mueve entero y lo
+        resuelve _collide_axis como antes.
+        """
+        hit = rects.sweep(self.rect, dx, dy) if (dx or dy) else None
+        if hit is None or hit[1] == (0, 0):
+            self.rect.move_ip(dx, dy)
+            return
+        _, (nx, ny), r = hit
+        if nx:
+            if nx < 0:
+                self.rect.right = r.left
+            else:
+                self.rect.left = r.right
+            self.pos.x = float(self.rect.x)
+            self.vel_x = 0.0
+        else:
+            if ny < 0:
+                # aterrizaje
+                self.rect.bottom = r.top
+                self.on_ground = True
+            else:
+                # golpe de cabeza
+                self.rect.top = r.bottom
+            self.pos.y = float(self.rect.y)
+            self.vel_y = 0.0
+
     def _collide_axis(self, rects, axis, prev_bottom=None):
         """
-        rects: lista de pygame.Rect (colisiones)
+        rects: SpatialGrid con los rects de colisión
         axis: "x" o "y"
         prev_bottom: bottom del rect antes del movimiento vertical (int) - se usa para detectar aterrizajes
         """
-        for r in rects:
+        # candidatos cercanos (margen de una celda por si la corrección nos desplaza)
+        near = self.rect.inflate(rects.cell_w * 2, rects.cell_h * 2)
+        for r in rects.query(near):
             if self.rect.colliderect(r):
                 if axis == "x":
                     if self.vel_x > 0:
@@ -276,6 +1975,24 @@ class Player:
     def do_attack(self):
         self.attack_timer = self.attack_cooldown
 
+    def save_state(self, w):
+        w.pack("9d4ib5?H", *self.start_pos, self.pos.x, self.pos.y, self.vel_x, self.vel_y,
+               self.frame_idx, self.attack_timer, self.attack_delay_timer,
+               *self.rect.topleft, *self.prev_pos, self.direction,
+               self.on_ground, self.is_jumping, self.is_attacking, self.attack_laser_fired,
+               self.attack_requested, self.image_index.get(id(self.image), 0))
+
+    def load_state(self, r):
+        (sx, sy, px, py, self.vel_x, self.vel_y, self.frame_idx, self.attack_timer,
+         self.attack_delay_timer, x, y, ppx, ppy, self.direction, self.on_ground,
+         self.is_jumping, self.is_attacking, self.attack_laser_fired, self.attack_requested,
+         image) = r.unpack("9d4ib5?H")
+        self.start_pos = (sx, sy)
+        self.pos.update(px, py)
+        self.rect.topleft = (x, y)
+        self.prev_pos = (ppx, ppy)
+        self.image = self.images[image]
+
     def reset(self):
         """Reinicia al jugador en la posición inicial"""
         self.rect.topleft = self.start_pos
@@ -286,8 +2003,67 @@ class Player:
         self.attack_timer = 0.0
         self.frame_idx = 0.0
 
+class Pool:
+    """
+    Pool de capacidad fija: los objetos se crean una vez y se reutilizan.
+    Los activos van en una lista compacta (active) y se sacan con swap-remove
+    en O(1); los libres esperan en una free list. Guarda el pico de uso y
+    cuántas veces se agotó.
+    """
+    def __init__(self, factory, capacity, name="pool"):
+        self.name = name
+        self.capacity = capacity
+        self.free = [factory() for _ in range(capacity)]
+        self.active = []
+        self.peak = 0
+        self.exhausted = 0
+
+    def acquire(self):
+        """Objeto libre (hay que reinicializarlo con spawn) o None si el pool está lleno"""
+        if not self.free:
+            self.exhausted += 1
+            return None
+        obj = self.free.pop()
+        obj.pool_index = len(self.active)
+        self.active.append(obj)
+        if len(self.active) > self.peak:
+            self.peak = len(self.active)
+        return obj
+
+    def release(self, obj):
+        """Devuelve obj al pool; el último activo ocupa su hueco"""
+        i = obj.pool_index
+        last = self.active.pop()
+        if last is not obj:
+            self.active[i] = last
+            last.pool_index = i
+        obj.pool_index = -1
+        self.free.append(obj)
+
+    def clear(self):
+        while self.active:
+            self.release(self.active[-1])
+
+    def __iter__(self):
+        return iter(self.active)
+
+    def __len__(self):
+        return len(self.active)
+
+    def stats(self):
+        return {"name": self.name, "capacity": self.capacity, "active": len(self.active),
+                "peak": self.peak, "exhausted": self.exhausted}
+
+
 class Laser:
     def __init__(self, x, y, direction, speed=200, length=100):
+        # imagen del láser (compartida) - en caso de no querer usar un rect
+        self.image = ASSETS.image(ASSET_DIR/"animations/bullet/bala.png")
+        self.pool_index = -1
+        self.spawn(x, y, direction, speed, length)
+
+    def spawn(self, x, y, direction, speed=200, length=100):
+        """(Re)inicia el láser; lo usa el pool para reutilizar instancias"""
         self.pos = pygame.Vector2(x, y)
         self.start_x = x            # <<< guardamos posición inicial
         self.direction = direction  # 1 = derecha, -1 = izquierda
@@ -297,98 +2073,122 @@ class Laser:
         # Rect para colisión (por si no se desea usar un sprite)
         #self.rect = pygame.Rect(self.pos.x, self.pos.y - 4, 16, 8)  
 
-        # cargar imagen del láser - en caso de no querer usar un rect
-        self.image = load_image(ASSET_DIR/"animations/bullet/bala.png")
         # ajustar rect según tamaño de la imagen
-        self.rect = self.image.get_rect(center=(x, y))
+        self.rect = ASSETS.rect(self.image, center=(x, y))
+        self.prev_pos = self.rect.topleft
+        self.moved_x = 0
+
+    STATE_FMT = "5db5i?"  # save_state/load_state (tamaño fijo)
+
+    def save_state(self, w):
+        w.pack(self.STATE_FMT, self.pos.x, self.pos.y, self.start_x, self.speed, self.length,
+               self.direction, *self.rect.topleft, *self.prev_pos, self.moved_x, self.active)
+
+    def load_state(self, r):
+        (px, py, self.start_x, self.speed, self.length, self.direction,
+         x, y, ppx, ppy, self.moved_x, self.active) = r.unpack(self.STATE_FMT)
+        self.pos.update(px, py)
+        self.rect.topleft = (x, y)
+        self.prev_pos = (ppx, ppy)
 
     def update(self, dt):
         dt_s = dt / 1000.0
-        # avanzar en X
+        # avanzar en X; moved_x (px) permite barrer el trayecto del paso
         self.pos.x += self.speed * dt_s * self.direction
+        self.moved_x = int(self.pos.x) - self.rect.x
         self.rect.x = int(self.pos.x)
 
         # desactivar si ha recorrido más que su longitud
         if abs(self.pos.x - self.start_x) > self.length:
             self.active = False
 
-    def draw(self, surf, camera):
-    # calcular posición relativa a la cámara
-        screen_pos = (self.rect.x - camera.rect.x, self.rect.y - camera.rect.y)
-        surf.blit(self.image, screen_pos)
+    def draw(self, surf, camera, alpha=1.0):
+        # calcular posición relativa a la cámara
+        x, y = interp_pos(self, alpha)
+        return surf.blit(self.image, ASSETS.draw_pos(self.image, x - camera.view.x, y - camera.view.y))
+
+
+def patrol_table(path):
+    """
+    Ruta de patrulla de ida y vuelta (p0..pn-1..p0) desplegada como una
+    polilínea con la longitud acumulada en cada vértice. La posición a una
+    distancia s del inicio (módulo cum[-1], la longitud del ciclo) se obtiene
+    con una búsqueda en cum: el movimiento es función pura del tiempo.
+    Devuelve (xs, ys, cum) como arrays float64.
+    """
+    pts = list(path) + list(path[-2::-1])
+    xy = np.array(pts, dtype=np.float64).reshape(-1, 2)
+    cum = np.zeros(len(xy), dtype=np.float64)
+    if len(xy) > 1:
+        cum[1:] = np.cumsum(np.hypot(np.diff(xy[:, 0]), np.diff(xy[:, 1])))
+    return xy[:, 0].copy(), xy[:, 1].copy(), cum
 
 
 class Enemy:
+    """
+    Rect e imagen de un enemigo para dibujar y colisionar. El resto del
+    estado (posición simulada, animación, vida, muerte) vive en los arrays
+    del EnemyManager que lo agrupa (manager/slot), que lo mueve en bloque.
+    """
     def __init__(self, x, y, w=32, h=32, speed=100, frames=None):
         self.frames = frames or []
-        self.frame_idx = 0.0
         self.frame_speed = 6.0  # frames por segundo
-        self.image = self.frames[0] if self.frames else load_image(ASSET_DIR/"enemy_placeholder.png")
+        self.image = self.frames[0] if self.frames else ASSETS.image(ASSET_DIR/"enemy_placeholder.png")
 
         # usar centro para que las rutas funcionen correctamente
-        self.rect = self.image.get_rect(center=(x, y))
+        self.rect = ASSETS.rect(self.image, center=(x, y))
+        self.prev_pos = self.rect.topleft
         self.speed = speed  # pixels/segundo
         self.path = []      # lista de puntos [(x,y), ...]
-        self.path_idx = 0
-        self.forward = True
-        self.hp = 1
-        self.dead = False
-
-    def update(self, dt):
-        if self.dead: return
-
-        # Animación
-        if self.frames:
-            self.frame_idx += self.frame_speed * (dt / 1000.0)
-            self.image = self.frames[int(self.frame_idx) % len(self.frames)]
-
-        # Movimiento por ruta
-        if not self.path: return
-
-        target = pygame.Vector2(self.path[self.path_idx])
-        pos = pygame.Vector2(self.rect.center)
-        dir_vec = target - pos
-        dist = dir_vec.length()
-
-        if dist < 2:
-            # cambiar de punto
-            if self.forward:
-                self.path_idx += 1
-                if self.path_idx >= len(self.path):
-                    self.path_idx = max(0, len(self.path)-1)
-                    self.forward = False
-            else:
-                self.path_idx -= 1
-                if self.path_idx < 0:
-                    self.path_idx = 0
-                    self.forward = True
+        self.route = None   # patrol_table(path), se compila al cargar el mapa
+        self.manager = None
+        self.slot = -1
+
+    @property
+    def dead(self):
+        return bool(self.manager.dead[self.slot])
+
+    @dead.setter
+    def dead(self, value):
+        if value:
+            self.manager.kill(self.slot)
         else:
-            vel = dir_vec.normalize() * self.speed * (dt / 1000.0)
-            self.rect.centerx += vel.x
-            self.rect.centery += vel.y
+            self.manager.dead[self.slot] = False
 
-    def reset(self):
-        self.rect.center = self.path[0] if self.path else self.rect.center
-        self.path_idx = 0
-        self.forward = True
-        self.dead = False
-        self.hp = 1
-        self.frame_idx = 0.0
+    @property
+    def hp(self):
+        return int(self.manager.hp[self.slot])
 
-    def draw(self, surf, camera):
-        if self.dead: return
-        screen_pos = (self.rect.x - camera.rect.x, self.rect.y - camera.rect.y)
-        surf.blit(self.image, screen_pos)
+    @hp.setter
+    def hp(self, value):
+        self.manager.hp[self.slot] = value
+        self.manager.touched[self.slot] = True
 
 class Explosion:
     def __init__(self, x, y, frames, frame_speed=12.0):
+        self.pool_index = -1
+        self.spawn(x, y, frames, frame_speed)
+
+    def spawn(self, x, y, frames, frame_speed=12.0):
+        """(Re)inicia la explosión; lo usa el pool para reutilizar instancias"""
         self.frames = frames
         self.frame_idx = 0.0
         self.frame_speed = frame_speed  # frames por segundo
         self.image = self.frames[0] if self.frames else None
-        self.rect = self.image.get_rect(center=(x, y)) if self.image else pygame.Rect(x, y, 32, 32)
+        self.rect = ASSETS.rect(self.image, center=(x, y)) if self.image else pygame.Rect(x, y, 32, 32)
         self.finished = False
 
+    STATE_FMT = "4i2d?"  # save_state/load_state (tamaño fijo)
+
+    def save_state(self, w):
+        w.pack(self.STATE_FMT, *self.rect, self.frame_idx, self.frame_speed, self.finished)
+
+    def load_state(self, r):
+        x, y, rw, rh, self.frame_idx, self.frame_speed, self.finished = r.unpack(self.STATE_FMT)
+        self.rect.update(x, y, rw, rh)
+        if self.frames:
+            self.image = self.frames[min(int(self.frame_idx), len(self.frames) - 1)]
+
     def update(self, dt):
         if self.finished: return
         self.frame_idx += self.frame_speed * (dt / 1000.0)
@@ -399,42 +2199,250 @@ class Explosion:
             self.image = self.frames[idx]
 
     def draw(self, surf, camera):
-        if self.finished: return
-        screen_pos = (self.rect.x - camera.rect.x, self.rect.y - camera.rect.y)
-        surf.blit(self.image, screen_pos)
+        if self.finished: return None
+        screen_pos = ASSETS.draw_pos(self.image, self.rect.x - camera.view.x, self.rect.y - camera.view.y)
+        return surf.blit(self.image, screen_pos)
 
 
 class Dron(Enemy):
     def __init__(self, x, y):
-        frames = [
-            load_image(ASSET_DIR/"animations/enemies/dron/dron1.png"),
-            load_image(ASSET_DIR/"animations/enemies/dron/dron2.png"),
-            load_image(ASSET_DIR/"animations/enemies/dron/dron3.png"),
-            load_image(ASSET_DIR/"animations/enemies/dron/dron4.png"),
-            load_image(ASSET_DIR/"animations/enemies/dron/dron5.png"),
-            load_image(ASSET_DIR/"animations/enemies/dron/dron6.png"),
-            load_image(ASSET_DIR/"animations/enemies/dron/dron7.png"),
-        ]
+        frames = ASSETS.frames("dron")
         super().__init__(x, y, w=48, h=24, speed=180, frames=frames)  # velocidad pixels/sec
 
 class Slime(Enemy):
     def __init__(self, x, y):
-        frames = [
-            load_image(ASSET_DIR/"animations/enemies/slime/slime1.png"),
-            load_image(ASSET_DIR/"animations/enemies/slime/slime2.png"),
-            load_image(ASSET_DIR/"animations/enemies/slime/slime3.png"),
-            load_image(ASSET_DIR/"animations/enemies/slime/slime4.png"),
-            load_image(ASSET_DIR/"animations/enemies/slime/slime5.png"),
-        ]
+        frames = ASSETS.frames("slime")
         super().__init__(x, y, w=32, h=24, speed=120, frames=frames)
 
+class EnemyManager:
+    """
+    Estado de todos los enemigos en arrays contiguos de NumPy (posición,
+    velocidad, ruta, dirección, animación, vivo/muerto) para avanzar todas
+    las patrullas en un solo paso vectorizado. Los objetos Enemy siguen
+    existiendo para dibujar y colisionar: sync() les copia rect e imagen.
+    """
+    def __init__(self, enemies):
+        self.enemies = list(enemies)
+        n = len(self.enemies)
+        # tablas de ruta (patrol_table) concatenadas: la de cada enemigo es
+        # [route_start, route_start + route_len)
+        tables = [e.route if e.route is not None else patrol_table(e.path) for e in self.enemies]
+        self.route_len = np.array([len(t[2]) for t in tables], dtype=np.int64)
+        self.route_start = np.zeros(n, dtype=np.int64)
+        if n:
+            self.route_start[1:] = np.cumsum(self.route_len)[:-1]
+        empty = np.zeros(0, dtype=np.float64)
+        self.route_x = np.concatenate([t[0] for t in tables] or [empty])
+        self.route_y = np.concatenate([t[1] for t in tables] or [empty])
+        self.route_s = np.concatenate([t[2] for t in tables] or [empty])
+        # longitud de ida y vuelta de cada ruta: el movimiento se repite con periodo cycle_len / speed
+        self.cycle_len = np.array([t[2][-1] if len(t[2]) else 0.0 for t in tables], dtype=np.float64)
+        # clave global creciente (longitud acumulada + base por enemigo) para
+        # buscar el tramo de todos los enemigos con un solo searchsorted
+        self.route_base = np.zeros(n, dtype=np.float64)
+        if n:
+            self.route_base[1:] = np.cumsum(self.cycle_len + 1.0)[:-1]
+        self.route_key = self.route_s + np.repeat(self.route_base, self.route_len)
+        # dirección de cada tramo por px recorrido (0 en el último vértice y en tramos nulos)
+        ds = np.diff(self.route_s, append=0.0)
+        ds = np.where(ds > 0, ds, np.inf)
+        self.route_dx = np.diff(self.route_x, append=0.0) / ds
+        self.route_dy = np.diff(self.route_y, append=0.0) / ds
+
+        self.x = np.array([e.rect.centerx for e in self.enemies], dtype=np.float64)
+        self.y = np.array([e.rect.centery for e in self.enemies], dtype=np.float64)
+        self.prev_x = self.x.copy()
+        self.prev_y = self.y.copy()
+        self.speed = np.array([e.speed for e in self.enemies], dtype=np.float64)
+        self.phase = np.zeros(n, dtype=np.float64)  # distancia recorrida en el ciclo (px)
+        self.frame_t = np.zeros(n, dtype=np.float64)
+        self.frame_speed = np.array([e.frame_speed for e in self.enemies], dtype=np.float64)
+        self.n_frames = np.array([max(1, len(e.frames)) for e in self.enemies], dtype=np.int64)
+        self.dead = np.zeros(n, dtype=bool)
+        self.hp = np.ones(n, dtype=np.int64)
+        self.has_path = self.route_len > 0
+        self.movable = self.has_path & (self.speed > 0) & (self.cycle_len > 0)
+        # tiempo (ms) que cada enemigo lleva sin simular (LOD / congelado)
+        self.pending = np.zeros(n, dtype=np.float64)
+        self.tick = 0
+        self.half_w = np.array([e.rect.w // 2 for e in self.enemies], dtype=np.int64)
+        self.half_h = np.array([e.rect.h // 2 for e in self.enemies], dtype=np.int64)
+        # estado inicial (spawn) para reiniciar con una copia en bloque
+        starts = np.where(self.has_path, self.route_start, 0)
+        self.init_x = np.where(self.has_path, self.route_x[starts], self.x) if len(self.route_x) else self.x.copy()
+        self.init_y = np.where(self.has_path, self.route_y[starts], self.y) if len(self.route_y) else self.y.copy()
+        # enemigos cuyo objeto (rect, imagen, broadphase) se apartó del spawn desde el último reinicio
+        self.touched = np.ones(n, dtype=bool)
+
+        # broadphase de enemigos vivos, al día con sync() y al morir
+        self.grid = DynamicGrid()
+
+        for slot, e in enumerate(self.enemies):
+            e.manager = self
+            e.slot = slot
+        self.reset_all()
+
+    def __len__(self):
+        return len(self.enemies)
+
+    def update(self, dt, mask=None):
+        """
+        Avanza animación y patrulla de los enemigos vivos seleccionados por mask
+        (todos si es None). dt en ms, escalar o un valor por enemigo.
+        La posición depende solo de la distancia recorrida en el ciclo (phase),
+        así que un dt grande (ponerse al día tras estar congelado) da el mismo
+        resultado que haber ido paso a paso, sin importar la velocidad.
+        """
+        if not self.enemies:
+            return np.zeros(0, dtype=np.int64)
+        sel = ~self.dead if mask is None else (mask & ~self.dead)
+        idx = np.nonzero(sel)[0]
+        t = np.broadcast_to(np.asarray(dt, dtype=np.float64) / 1000.0, self.x.shape)[idx]
+        self.frame_t[idx] += self.frame_speed[idx] * t
+        self.touched[idx] = True
+        updated = idx
+
+        move = self.movable[idx]
+        idx, t = idx[move], t[move]
+        if idx.size:
+            # las vueltas completas no cambian el estado
+            self.phase[idx] = np.fmod(self.phase[idx] + self.speed[idx] * t, self.cycle_len[idx])
+            self._place(idx)
+        return updated
+
+    def _place(self, idx):
+        """Pone a los enemigos idx en el punto de su ruta que corresponde a phase"""
+        s = self.phase[idx]
+        # tramo k de cada enemigo: 0 <= phase < cycle_len, así que cae dentro de su propia tabla
+        k = np.searchsorted(self.route_key, s + self.route_base[idx], side="right") - 1
+        along = s - self.route_s[k]
+        self.x[idx] = self.route_x[k] + self.route_dx[k] * along
+        self.y[idx] = self.route_y[k] + self.route_dy[k] * along
+
+    def _outside(self, rect):
+        """Distancia (px, por eje la mayor) de cada enemigo a rect; 0 si está dentro"""
+        ox = np.maximum(np.maximum(rect.left - self.x, self.x - rect.right), 0.0)
+        oy = np.maximum(np.maximum(rect.top - self.y, self.y - rect.bottom), 0.0)
+        return np.maximum(ox, oy)
+
+    def update_regions(self, dt, focus):
+        """
+        Simula por regiones alrededor de focus (rect de la cámara): cerca cada
+        paso, a media distancia cada SIM_LOD_INTERVAL pasos y lejos nada; el
+        tiempo no simulado se acumula y se aplica de golpe cuando toca.
+        Devuelve los índices actualizados.
+        """
+        if not self.enemies:
+            return np.zeros(0, dtype=np.int64)
+        self.tick += 1
+        self.pending[~self.dead] += dt
+        dist = self._outside(focus)
+        active = dist <= SIM_ACTIVE_MARGIN
+        # escalonado por índice para repartir la carga entre pasos
+        lod = (dist <= SIM_LOD_MARGIN) & (np.arange(len(self.enemies)) % SIM_LOD_INTERVAL == self.tick % SIM_LOD_INTERVAL)
+        mask = active | lod
+        updated = self.update(self.pending, mask)
+        self.pending[updated] = 0.0
+        return updated
+
+    def visible(self, rect):
+        """Índices de enemigos vivos cuyo rect toca rect (para dibujar)"""
+        if not self.enemies:
+            return []
+        hit = (~self.dead
+               & (self.x + self.half_w >= rect.left) & (self.x - self.half_w < rect.right)
+               & (self.y + self.half_h >= rect.top) & (self.y - self.half_h < rect.bottom))
+        return np.nonzero(hit)[0].tolist()
+
+    def store_prev(self):
+        np.copyto(self.prev_x, self.x)
+        np.copyto(self.prev_y, self.y)
+
+    def sync(self, idx=None):
+        """
+        Copia posición (actual y anterior) e imagen de los arrays a los objetos
+        Enemy; idx limita la copia a esos índices (p. ej. los recién simulados).
+        """
+        if idx is None:
+            idx = np.nonzero(~self.dead)[0]
+        idx = np.asarray(idx, dtype=np.int64)
+        xs = self.x[idx].astype(np.int64).tolist()
+        ys = self.y[idx].astype(np.int64).tolist()
+        pxs = (self.prev_x[idx].astype(np.int64) - self.half_w[idx]).tolist()
+        pys = (self.prev_y[idx].astype(np.int64) - self.half_h[idx]).tolist()
+        frames = (self.frame_t[idx].astype(np.int64) % self.n_frames[idx]).tolist()
+        self.touched[idx] = True
+        enemies = self.enemies
+        grid = self.grid
+        for k, i in enumerate(idx.tolist()):
+            e = enemies[i]
+            e.rect.center = (xs[k], ys[k])
+            e.prev_pos = (pxs[k], pys[k])
+            if e.frames:
+                e.image = e.frames[frames[k]]
+            grid.update(i, e.rect)
+
+    def save_state(self, w):
+        w.pack("Iq", len(self.enemies), self.tick)
+        for arr in (self.x, self.y, self.prev_x, self.prev_y, self.frame_t, self.pending,
+                    self.phase, self.dead):
+            w.ndarray(arr)
+        w.ndarray(self.hp)
+
+    def load_state(self, r):
+        n, self.tick = r.unpack("Iq")
+        if n != len(self.enemies):
+            raise ValueError(f"la instantánea tiene {n} enemigos y el mapa {len(self.enemies)}")
+        # lo que ven los objetos Enemy (rect, interpolación, imagen, broadphase)
+        shown = (self.x, self.y, self.prev_x, self.prev_y, self.frame_t, self.dead)
+        before = [arr.copy() for arr in shown]
+        for arr in (self.x, self.y, self.prev_x, self.prev_y, self.frame_t, self.pending,
+                    self.phase, self.dead):
+            r.ndarray(arr)
+        r.ndarray(self.hp)
+        # solo se sincronizan los enemigos que cambian respecto al estado actual
+        changed = np.zeros(n, dtype=bool)
+        for old, arr in zip(before, shown):
+            changed |= old != arr
+        idx = np.nonzero(changed)[0]
+        gone = idx[self.dead[idx]]
+        for slot in gone.tolist():
+            self.grid.remove(slot)
+        # sync marca los cambiados como touched; los iguales conservan su marca (siguen igual)
+        self.sync(idx[~self.dead[idx]])
+        self.touched[gone] = True
+
+    def kill(self, slot):
+        """Marca el enemigo como muerto y lo saca de la broadphase"""
+        self.dead[slot] = True
+        self.touched[slot] = True
+        self.grid.remove(slot)
+
+    def reset_all(self):
+        """
+        Vuelve a todos los enemigos a su estado inicial: los arrays se copian
+        en bloque desde el estado de spawn y solo los objetos que se movieron,
+        animaron o murieron desde el último reinicio (touched) se sincronizan.
+        """
+        if not self.enemies:
+            return
+        idx = np.nonzero(self.touched)[0]
+        np.copyto(self.x, self.init_x)
+        np.copyto(self.y, self.init_y)
+        self.phase.fill(0.0)
+        self.dead.fill(False)
+        self.frame_t.fill(0.0)
+        self.pending.fill(0.0)
+        self.hp.fill(1)
+        self.store_prev()
+        self.sync(idx)
+        self.touched.fill(False)
+
+
 def is_on_ground(player, collision_rects):
     """Devuelve True si hay suelo justo debajo del jugador"""
     test_rect = player.rect.move(0, 2)  # desplazamos 2px hacia abajo
-    for r in collision_rects:
-        if test_rect.colliderect(r):
-            return True
-    return False
+    return bool(collision_rects.query(test_rect))
 
 
 # -----------------------
@@ -456,29 +2464,40 @@ class Game:
         self.level_transition_timer = 0.0  # tiempo que mostramos mensaje "Completado"
         # estados
         self.state = "menu"  # "menu" o "playing"
-        # cargar primer mapa
-        self._load_map(self.maps[self.current_map_index])
-        # spawn
-        sp = self._find_object_by_name("player")
-        sx, sy = (sp.x, sp.y) if sp else (100, 100)
-        self.player = Player(sx, sy)
-        self.player.sound_jump = load_sound(MEDIA_DIR/"audio"/"salto.mp3")
-        # camara
-        self.camera = Camera(self.world_w, self.world_h, WIDTH, HEIGHT, zoom=1)
-        # ataques
-        self.lasers = []
+        # carga en segundo plano del siguiente mapa
+        self.level_loader = LevelLoader()
+        # tiempo real pendiente de simular (ms)
+        self.sim_accumulator = 0.0
+        # perfilado: panel (F3) y traza (F4 o --trace)
+        self.show_profiler = False
+        # ritmo de frames (FPS objetivo, reposo en menú, sin foco)
+        self.pacer = FramePacer(clock)
+        self.profiler_overlay = ProfilerOverlay(PROFILER, DEBUG_FONT, pacer=self.pacer)
+        self.trace_path = None
+        # grabación de la entrada por paso (--record); ver InputRecorder
+        self.record_path = None
+        self.seed = None  # semilla de las partidas (None = según la hora)
+        self.recorder = None
+        self.recorded_sessions = 0
+        self._pending_actions = 0  # atajos (tecla N) a aplicar en el siguiente paso
+        self.deaths = {"enemy": 0, "fall": 0}  # reinicios de la partida actual por causa
+        # volcado a ventana por regiones cambiadas
+        self.dirty = DirtyRects()
+        self._menu_idx_drawn = None
+        self._last_view = None
+        # ataques (pools de instancias reutilizables)
+        self.lasers = Pool(lambda: Laser(0, 0, 1), LASER_POOL_SIZE, "lasers")
         # Cargar frames de explosión
-        self.explosion_frames = [
-            load_image(ASSET_DIR/"animations/explosion/explosion1.png"),
-            load_image(ASSET_DIR/"animations/explosion/explosion2.png"),
-            load_image(ASSET_DIR/"animations/explosion/explosion3.png"),
-            load_image(ASSET_DIR/"animations/explosion/explosion4.png"),
-            load_image(ASSET_DIR/"animations/explosion/explosion5.png"),
-        ]
-        self.explosions = []  # lista de explosiones activas    
-        # cargar enemigos desde objetos
-        self.enemies = []
-        self._load_enemies_from_tiled()
+        self.explosion_frames = ASSETS.frames("explosion")
+        self.explosions = Pool(lambda: Explosion(0, 0, self.explosion_frames),
+                               EXPLOSION_POOL_SIZE, "explosions")  # explosiones activas
+        # niveles ya preparados (por ruta): volver a un mapa no relee disco ni parsea TMX
+        self.levels = {}
+        self.checkpoint = None  # instantánea de reaparición (F5 guarda, F9 vuelve)
+        # cargar primer mapa (crea jugador, cámara y enemigos)
+        self._load_map(self.maps[self.current_map_index])
+        # estado inicial para volver al menú sin recargar el mapa
+        self.menu_snapshot = self.snapshot()
         # hud / mundo
         self.world_name = "MUNDO 1"
         self.world_completed = False
@@ -486,87 +2505,136 @@ class Game:
         # assets UI/menu
         self.menu_bg = load_image(ASSET_DIR/"portada.jpeg", convert_alpha=False)
         self.music_menu = self._load_music_safe(MEDIA_DIR/"music"/"menu.mp3")
-        self.sound_jump = load_sound(MEDIA_DIR/"audio"/"salto.mp3")
-        self.sound_move = load_sound(MEDIA_DIR/"audio"/"movimiento.mp3")
-        self.sound_attack = load_sound(MEDIA_DIR/"audio"/"ataque.mp3")
-        self.sound_explosion = load_sound(MEDIA_DIR/"audio"/"explosion.mp3")        
-        self.sound_move.set_volume(0.1) # Volumen más bajo para el movimiento
-        self.sound_jump.set_volume(0.8) # Volumen medio para el salto
-        self.sound_attack.set_volume(0.3) # Volumen medio para el ataque
-        self.sound_explosion.set_volume(0.7) # Volumen más alto para la explosión
-        # canales de sonido dedicados
-        self.move_channel = pygame.mixer.Channel(1)
-        self.jump_channel = pygame.mixer.Channel(2)
-        self.explosion_channel = pygame.mixer.Channel(3)
-        self.attack_channel = pygame.mixer.Channel(4)
+        # efectos decodificados una vez (volúmenes y prioridades en SOUNDS)
+        AUDIO.preload()
         if self.music_menu:
-            pygame.mixer.music.load(str(self.music_menu))
-            pygame.mixer.music.play(-1)
+            AUDIO.play_music(self.music_menu)
 
-        # optimization: precompute tile surface? We'll draw visible tiles only.
-        self.tile_cache = None
+        # superficies de render reutilizables
+        self.render_targets = RenderTargets(screen)
 
         # menu cursor
         self.menu_options = ["INICIAR", "SALIR"]
         self.menu_idx = 0
 
-    def _load_map(self, map_path):
-        self.tmx = pytmx.util_pygame.load_pygame(map_path)
+    def _prepare_level(self, map_path):
+        """
+        Prepara todo lo que no necesita la pantalla (parseo TMX, colisiones,
+        spawns y fondo sin convertir). Se puede ejecutar en un hilo: no toca
+        el estado del juego.
+        """
+        t0 = time.perf_counter()
+        level = None
+        if LEVEL_CACHE:
+            try:
+                level = load_level_cache(map_path)
+            except Exception as e:
+                log(f"Caché de {map_path.stem} inválida, se regenera: {e}")
+        if level is None:
+            level = LevelData(map_path)
+            records = {}
+            level.tmx = pytmx.TiledMap(str(map_path), image_loader=partial(deferred_image_loader, records=records))
+            level.collision_rects = self._load_collision_rects(level.tmx)
+            sp = self._find_object_by_name("player", level.tmx)
+            level.spawn = (sp.x, sp.y) if sp else (100, 100)
+            level.enemy_specs = self._enemy_specs(level.tmx)
+            if LEVEL_CACHE:
+                try:
+                    save_level_cache(level, records)
+                except Exception as e:
+                    log(f"No se pudo guardar la caché de {map_path.stem}: {e}")
+
+        bg_file = self.map_backgrounds.get(map_path.stem)
+        if bg_file:
+            try:
+                level.bg_raw = pygame.image.load(str(bg_file))
+            except Exception as e:
+                log(f"Error cargando imagen: {bg_file}, {e}")
+
+        level.prepare_ms = (time.perf_counter() - t0) * 1000.0
+        return level
+
+    def _load_map(self, map_path, level=None):
+        """
+        Activa un mapa; si no viene ya preparado (level) se usa el de
+        self.levels o se prepara aquí mismo
+        """
+        if level is None:
+            level = self.levels.get(map_path) or self._prepare_level(map_path)
+            self.levels[map_path] = level
+        t0 = time.perf_counter()
+        # único paso en el hilo principal: convertir superficies al formato de pantalla
+        if not level.converted:
+            convert_tmx_images(level.tmx)
+            level.converted = True
+        self.dirty.invalidate()
+        self.checkpoint = None
+
+        self.tmx = level.tmx
         self.world_w = self.tmx.width * self.tmx.tilewidth
         self.world_h = self.tmx.height * self.tmx.tileheight
-        self.collision_rects = self._load_collision_rects()
+        self.collision_rects = level.collision_rects
+        # chunks de tiles (se hornean al entrar en cámara)
+        self.tile_cache = TileChunkCache(self.tmx)
 
         # spawn jugador
-        sp = self._find_object_by_name("player")
-        sx, sy = (sp.x, sp.y) if sp else (100, 100)
+        sx, sy = level.spawn
         if hasattr(self, "player"):
-            self.player.reset()
             self.player.start_pos = (sx, sy)
+            self.player.reset()
         else:
             self.player = Player(sx, sy)
 
         # cámara
         self.camera = Camera(self.world_w, self.world_h, WIDTH, HEIGHT, zoom=1)
 
-        # enemigos
+        # enemigos (estado en arrays para moverlos en bloque)
         self.enemies = []
-        self._load_enemies_from_tiled()
+        self._load_enemies_from_tiled(level.enemy_specs)
+        self.enemy_manager = EnemyManager(self.enemies)
 
         # HUD
         self.world_name = f"MUNDO {self.current_map_index + 1}"
+        if DEBUG:
+            log("Assets:", ASSETS.stats(), "Texto:", TEXT.stats(), "Audio:", AUDIO.stats())
+            if hasattr(self, "lasers"):
+                log("Pools:", self.lasers.stats(), self.explosions.stats())
 
         # asignar fondo automáticamente según diccionario
-        bg_file = self.map_backgrounds.get(map_path.stem)
-        if bg_file:
-            self.bg_image = load_image(bg_file, convert_alpha=False)
-        else:
-            self.bg_image = None
+        self.bg_image = level.bg_raw.convert() if level.bg_raw else None
+        if hasattr(self, "render_targets"):
+            self.render_targets.clear()
 
-        # cargar música específica del mapa
-        music_file = self.map_music.get(map_path.stem)
-        if music_file and music_file.exists():
-            try:
-                pygame.mixer.music.load(str(music_file))
-                pygame.mixer.music.play(-1)
-            except Exception as e:
-                print(f"No se pudo reproducir música para {map_path.stem}: {e}")
-        else:
-            pygame.mixer.music.stop()  # si no hay música, parar
+        # música del mapa: se decodifica en segundo plano y entra con fundido (None = silencio)
+        AUDIO.play_music(self.map_music.get(map_path.stem))
 
+        finish_ms = (time.perf_counter() - t0) * 1000.0
+        origin = "caché" if level.from_cache else "TMX"
+        log(f"Mapa {map_path.stem} cargado ({origin}): {level.prepare_ms:.1f} ms preparando, "
+              f"{finish_ms:.1f} ms en el hilo principal")
+
+    def _preload_next_map(self):
+        """Empieza a preparar el siguiente mapa en segundo plano (si lo hay)"""
+        nxt = self.current_map_index + 1
+        if nxt < len(self.maps) and self.maps[nxt] not in self.levels:
+            self.level_loader.start(self.maps[nxt], self._prepare_level)
+            AUDIO.prefetch(self.map_music.get(self.maps[nxt].stem))
 
     def _load_music_safe(self, p):
         try:
-            return str(p)
+            return str(p) if Path(p).exists() else None
         except Exception:
             return None
 
-    def _find_object_by_name(self, name):
-        for obj in self.tmx.objects:
+    def _find_object_by_name(self, name, tmx=None):
+        for obj in (tmx or self.tmx).objects:
             if obj.name == name:
                 return obj
         return None
 
-    def _load_collision_rects(self):
+    def _load_collision_rects(self, tmx=None):
+        """Devuelve un SpatialGrid con los rects sólidos del mapa"""
+        tmx = tmx or self.tmx
         rects = []
         # intentamos varias nombres usuales (español/inglés) y si no, tomamos la primera capa de tiles
         layer = None
@@ -574,28 +2642,30 @@ class Game:
                   "Collision", "Capa de colisiones", "Capa de patrones 1", "capa de patrones 1"]
         for c in candidates:
             try:
-                layer = self.tmx.get_layer_by_name(c)
+                layer = tmx.get_layer_by_name(c)
                 break
             except Exception:
                 layer = None
 
         if layer is None:
             # fallback: primera capa de tiles visible
-            for lay in self.tmx.layers:
+            for lay in tmx.layers:
                 if isinstance(lay, pytmx.TiledTileLayer):
                     layer = lay
                     break
 
         if layer:
-            tw = self.tmx.tilewidth
-            th = self.tmx.tileheight
+            tw = tmx.tilewidth
+            th = tmx.tileheight
             # iterar por todos los tiles de esa capa
-            for x, y, gid in layer:
-                if gid:
-                    rects.append(pygame.Rect(x * tw, y * th, tw, th))
+            solid = [(x, y) for x, y, gid in layer if gid]
+            if MERGE_COLLISION_RECTS:
+                rects = merge_tile_rects(solid, tw, th)
+            else:
+                rects = [pygame.Rect(x * tw, y * th, tw, th) for x, y in solid]
         else:
             # fallback final: buscar objetos tipo/nombre 'collision'
-            for obj in self.tmx.objects:
+            for obj in tmx.objects:
                 t = (obj.type or "").lower()
                 n = (obj.name or "").lower()
                 if t == "collision" or n == "collision":
@@ -603,9 +2673,9 @@ class Game:
 
         # DEBUG: imprime cuántos rects de colisión tenemos (puedes comentar)
         if DEBUG:
-            print("Collision rects:", len(rects))
+            log("Collision rects:", len(rects))
 
-        return rects
+        return SpatialGrid(rects, tmx.tilewidth, tmx.tileheight)
 
     def _parse_route_prop(self, prop):
         # acepta "x1,y1;x2,y2"
@@ -619,77 +2689,219 @@ class Game:
                 continue
         return pts
 
-    def _load_enemies_from_tiled(self):
-        print("Objetos en TMX:")
-        for obj in self.tmx.objects:
-            print(f"Nombre: {obj.name}, Tipo: {obj.type}, X: {obj.x}, Y: {obj.y}, Puntos: {getattr(obj,'points',None)}")
+    def _enemy_specs(self, tmx):
+        """Lista de (tipo, x, y, ruta) de los enemigos del mapa, sin crear objetos"""
+        log("Objetos en TMX:")
+        for obj in tmx.objects:
+            log(f"Nombre: {obj.name}, Tipo: {obj.type}, X: {obj.x}, Y: {obj.y}, Puntos: {getattr(obj,'points',None)}")
 
-        for obj in self.tmx.objects:
+        specs = []
+        for obj in tmx.objects:
             name = (obj.name or "").lower()
             typ = (obj.type or "").lower()
 
             # determinar tipo de enemigo
             if name in ("dron", "slime") or typ in ("dron", "slime"):
                 x, y = obj.x, obj.y
-                if name == "dron" or typ == "dron":
-                    e = Dron(x, y)
-                else:
-                    e = Slime(x, y)
+                kind = "dron" if (name == "dron" or typ == "dron") else "slime"
 
                 # si el objeto tiene polyline
                 if hasattr(obj, "points") and obj.points:
-                    e.path = [(px, py) for (px, py) in obj.points]
+                    path = [(px, py) for (px, py) in obj.points]
                 else:
                     # propiedad 'route' tipo "x1,y1;x2,y2"
                     route_prop = getattr(obj, "properties", {}).get("route")
                     if route_prop:
-                        pts = []
-                        for seg in route_prop.split(";"):
-                            try:
-                                px, py = seg.split(",")
-                                pts.append((float(px), float(py)))
-                            except:
-                                continue
-                        e.path = pts
+                        path = self._parse_route_prop(route_prop)
                     else:
                         # fallback: patrulla horizontal simple
-                        e.path = [(x, y), (x + 128, y)]
+                        path = [(x, y), (x + 128, y)]
+
+                specs.append((kind, x, y, path))
+        return specs
 
-                self.enemies.append(e)
+    def _load_enemies_from_tiled(self, specs=None):
+        if specs is None:
+            specs = self._enemy_specs(self.tmx)
+        for kind, x, y, path in specs:
+            e = Dron(x, y) if kind == "dron" else Slime(x, y)
+            e.path = list(path)
+            # tabla de la ruta (longitud acumulada) compilada una vez por carga
+            e.route = patrol_table(e.path)
+            self.enemies.append(e)
 
 
     def draw_map_region(self, surf, camera):
-        # dibuja solo tiles visibles dentro de camera.rect
-        tw, th = self.tmx.tilewidth, self.tmx.tileheight
-        left = max(0, camera.rect.x // tw - 1)
-        right = min(self.tmx.width, (camera.rect.right // tw) + 2)
-        top = max(0, camera.rect.y // th - 1)
-        bottom = min(self.tmx.height, (camera.rect.bottom // th) + 2)
-
-        for layer in self.tmx.visible_layers:
-            if isinstance(layer, pytmx.TiledTileLayer):
-                for x in range(left, right):
-                    for y in range(top, bottom):
-                        gid = layer.data[y][x]
-                        if gid:
-                            tile = self.tmx.get_tile_image_by_gid(gid)
-                            if tile:
-                                sx = x*tw - camera.rect.x
-                                sy = y*th - camera.rect.y
-                                surf.blit(tile, (sx, sy))
-            elif isinstance(layer, pytmx.TiledImageLayer):
-                if layer.image:
-                    sx = getattr(layer, "offsetx", 0) - camera.rect.x
-                    sy = getattr(layer, "offsety", 0) - camera.rect.y
-                    surf.blit(layer.image, (sx, sy))
+        # dibuja solo los chunks visibles dentro de la vista (interpolada) de la cámara
+        t0 = time.perf_counter()
+        PROFILER.count("blits", self.tile_cache.draw(surf, camera.view))
+        PROFILER.add("map", t0)
+
+    def _store_prev_positions(self):
+        """Guarda las posiciones antes de un paso de simulación (para interpolar al dibujar)"""
+        self.player.prev_pos = self.player.rect.topleft
+        self.camera.prev_pos = self.camera.rect.topleft
+        self.enemy_manager.store_prev()
+        for laser in self.lasers:
+            laser.prev_pos = laser.rect.topleft
+
+    def step_game(self, keys, frame_ms):
+        """
+        Avanza la simulación en pasos fijos de 1/SIM_HZ con el tiempo real
+        acumulado y devuelve alpha (fracción del siguiente paso) para interpolar.
+        """
+        step_ms = 1000.0 / SIM_HZ
+        # si el frame fue larguísimo se descarta el exceso en vez de encadenar pasos sin fin
+        self.sim_accumulator = min(self.sim_accumulator + frame_ms, self.pacer.max_frame_ms(step_ms))
+        while self.sim_accumulator >= step_ms and self.state == "playing":
+            mask = input_mask(keys) | self._pending_actions
+            self._pending_actions = 0
+            self.apply_actions(mask)
+            self._store_prev_positions()
+            self.update_game(keys, step_ms)
+            if self.recorder:
+                self.recorder.record(mask, state_hash(self))
+            self.sim_accumulator -= step_ms
+        return self.sim_accumulator / step_ms
+
+    def apply_actions(self, mask):
+        """Atajos de juego que viajan con la entrada del paso (para grabarlos y reproducirlos)"""
+        if mask & ACTION_COMPLETE_WORLD:
+            self.world_completed = True
+            self.level_transition_timer = 2.0  # segundos para transición
+        if mask & ACTION_SAVE_CHECKPOINT:
+            self.checkpoint = self.snapshot()
+        if mask & ACTION_LOAD_CHECKPOINT and self.checkpoint:
+            self.restore(self.checkpoint)
+
+    def start_play(self, seed=None):
+        """
+        Empieza la partida en el mapa actual desde un estado limpio (jugador
+        nuevo, sin láseres ni explosiones, RNG sembrado), de modo que una
+        grabación y su replay parten exactamente del mismo estado.
+        """
+        seed = int(time.time()) if seed is None else seed
+        random.seed(seed)
+        np.random.seed(seed & 0xFFFFFFFF)
+        self.state = "playing"
+        self.world_completed = False
+        self.level_transition_timer = 0.0
+        self.sim_accumulator = 0.0
+        self._pending_actions = 0
+        self.deaths = {"enemy": 0, "fall": 0}
+        self.lasers.clear()
+        self.explosions.clear()
+        self.player = Player(0, 0)
+        self._load_map(self.maps[self.current_map_index])
+        if self.record_path:
+            self.recorder = InputRecorder(seed, self.maps, self.current_map_index)
+
+    def respawn(self):
+        """Tras morir: vuelve al checkpoint si hay uno, si no al inicio del mapa"""
+        if self.checkpoint:
+            # reaparecer no deshace el progreso (mundo completado con la transición en curso)
+            completed, timer = self.world_completed, self.level_transition_timer
+            self.restore(self.checkpoint)
+            self.world_completed, self.level_transition_timer = completed, timer
+        else:
+            self.player.reset()
+            #reiniciar enemigos tambien
+            self.enemy_manager.reset_all()
+
+    def snapshot(self):
+        """
+        Estado dinámico de la partida en bytes: mapa, jugador, cámara,
+        arrays de enemigos, láseres y explosiones activos. No incluye nada
+        del nivel (tiles, colisiones, rutas), que ya está en memoria.
+        """
+        w = _CacheWriter()
+        w.buf += SNAPSHOT_MAGIC
+        w.pack("HH?d", SNAPSHOT_VERSION, self.current_map_index, self.world_completed,
+               self.level_transition_timer)
+        self.player.save_state(w)
+        self.camera.save_state(w)
+        self.enemy_manager.save_state(w)
+        for pool in (self.lasers, self.explosions):
+            w.pack("H", len(pool))
+            for obj in pool:
+                obj.save_state(w)
+        return bytes(w.buf)
+
+    def restore(self, data):
+        """
+        Vuelve al estado de snapshot(). Si es del mapa activo solo se copia el
+        estado dinámico; si es de otro, el mapa se activa desde self.levels.
+        """
+        if data[:4] != SNAPSHOT_MAGIC:
+            raise ValueError("no es una instantánea de RUSTWALKER")
+        r = _CacheReader(data)
+        r.pos = 4
+        version, map_index, self.world_completed, self.level_transition_timer = r.unpack("HH?d")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"versión de instantánea {version} no soportada")
+        if map_index != self.current_map_index:
+            self.current_map_index = map_index
+            self._load_map(self.maps[map_index])
+        self.player.load_state(r)
+        self.camera.load_state(r)
+        self.enemy_manager.load_state(r)
+        for pool, cls, spawn in ((self.lasers, Laser, lambda obj: obj.spawn(0, 0, 1)),
+                                 (self.explosions, Explosion,
+                                  lambda obj: obj.spawn(0, 0, self.explosion_frames))):
+            pool.clear()
+            (n,) = r.unpack("H")
+            for _ in range(n):
+                obj = pool.acquire()
+                if obj is None:
+                    # más activos de los que caben en el pool: se descartan como al disparar
+                    r.pos += struct.calcsize("<" + cls.STATE_FMT)
+                    continue
+                spawn(obj)
+                obj.load_state(r)
+        self.dirty.invalidate()
+
+    def stop_recording(self):
+        """Guarda la grabación en curso (una partida por archivo: x.rwr, x-2.rwr...)"""
+        if not self.recorder:
+            return
+        self.recorded_sessions += 1
+        path = Path(self.record_path)
+        if self.recorded_sessions > 1:
+            path = path.with_name(f"{path.stem}-{self.recorded_sessions}{path.suffix}")
+        self.recorder.save(path)
+        log(f"Entrada grabada en {path} ({len(self.recorder.masks)} pasos)")
+        self.recorder = None
+
+    def toggle_trace(self):
+        """Empieza a grabar una traza o, si ya se graba, la guarda en disco"""
+        if PROFILER.tracing:
+            PROFILER.dump_trace(self.trace_path or time.strftime("trace_%Y%m%d_%H%M%S.json"))
+        else:
+            PROFILER.start_trace()
+            log("Grabando traza (F4 para guardar)")
+        PROFILER.enabled = self.show_profiler or PROFILER.tracing
 
     def run(self):
         running = True
         while running:
-            dt = clock.tick(60)
-            for event in pygame.event.get():
+            # el menú sin nada que animar duerme hasta el siguiente evento
+            idle = self.state == "menu" and not self.show_profiler and not PROFILER.tracing
+            dt, events = self.pacer.wait(idle)
+            frame_t0 = time.perf_counter()
+            blocks0 = sys.getallocatedblocks() if PROFILER.enabled else 0
+            draw = not HEADLESS and self.pacer.should_render
+            for event in events:
                 if event.type == pygame.QUIT:
                     running = False
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    self.show_profiler = not self.show_profiler
+                    PROFILER.enabled = self.show_profiler or PROFILER.tracing
+                    # el panel aparece o desaparece: hay que volcar la pantalla entera
+                    self.dirty.invalidate()
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                    self.toggle_trace()
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+                    self.dirty.invalidate()
                 elif event.type == pygame.KEYDOWN:
                     if self.state == "menu":
                         if event.key == pygame.K_UP:
@@ -698,32 +2910,59 @@ class Game:
                             self.menu_idx = (self.menu_idx + 1) % len(self.menu_options)
                         elif event.key == pygame.K_RETURN:
                             if self.menu_options[self.menu_idx] == "INICIAR":
-                                self.state = "playing"
-                                pygame.mixer.music.stop()
-                                self._load_map(self.maps[self.current_map_index])
+                                self.start_play(self.seed)
                             elif self.menu_options[self.menu_idx] == "SALIR":
                                 running = False
                     else:
                         # atajos en juego
                         if event.key == pygame.K_n:
-                            # marcar mundo completado (ejemplo)
-                            self.world_completed = True
-                            self.level_transition_timer = 2.0  # segundos para transición
+                            # marcar mundo completado (ejemplo); se aplica en el siguiente paso
+                            self._pending_actions |= ACTION_COMPLETE_WORLD
+                        if event.key == pygame.K_F5:
+                            self._pending_actions |= ACTION_SAVE_CHECKPOINT
+                        if event.key == pygame.K_F9:
+                            self._pending_actions |= ACTION_LOAD_CHECKPOINT
                         if event.key == pygame.K_ESCAPE:
                             self.reset_to_menu()
-                            if self.music_menu:
-                                pygame.mixer.music.load(self.music_menu)
-                                pygame.mixer.music.play(-1)
 
             keys = pygame.key.get_pressed()
+            PROFILER.add("input", frame_t0)
+            AUDIO.update()
+            if self.show_profiler:
+                # el panel es translúcido: todo lo de debajo se redibuja cada frame que se muestra
+                self.dirty.invalidate()
             if self.state == "menu":
+                self.sim_accumulator = 0.0
                 self.update_menu(keys)
-                self.render_menu()
+                if draw:
+                    self.render_menu()
             else:
-                self.update_game(keys, dt)
-                self.render_game()
-
-            pygame.display.flip()
+                alpha = self.step_game(keys, dt)
+                if not draw:
+                    pass  # sin render (headless o minimizada): solo simulación
+                elif self.state == "menu":
+                    self.render_menu()
+                else:
+                    self.render_game(alpha)
+
+            if self.show_profiler and draw:
+                t0 = time.perf_counter()
+                self.profiler_overlay.draw(screen)
+                PROFILER.add("overlay", t0)
+
+            if draw:
+                t0 = time.perf_counter()
+                PROFILER.count("dirty_rects", self.dirty.present())
+                PROFILER.add("flip", t0)
+
+            if PROFILER.enabled:
+                PROFILER.add("frame", frame_t0)
+                PROFILER.count("alloc_blocks", sys.getallocatedblocks() - blocks0)
+                PROFILER.end_frame()
+        if PROFILER.tracing:
+            self.toggle_trace()
+        self.stop_recording()
+        log("Ritmo de frames:", self.pacer.stats())
         pygame.quit()
         sys.exit()
 
@@ -732,28 +2971,41 @@ class Game:
         pass
 
     def render_menu(self):
-        screen.fill((0,0,0))
-        if self.menu_bg:
-            screen.blit(pygame.transform.scale(self.menu_bg, (WIDTH, HEIGHT)), (0,0))
-        # dibujar opciones
-        title_surf = FONT.render("RUSTWALKER", True, (0,255,0))
-        screen.blit(title_surf, (WIDTH//2 - title_surf.get_width()//2, 80))
-        for i, opt in enumerate(self.menu_options):
+        # el menú es estático: solo se redibuja lo que cambia (el cursor)
+        if not self.dirty.full and self._menu_idx_drawn == self.menu_idx:
+            return
+        bg = self.render_targets.scaled(self.menu_bg, (WIDTH, HEIGHT)) if self.menu_bg else None
+        if self.dirty.full or self._menu_idx_drawn is None:
+            screen.fill((0,0,0))
+            if bg:
+                screen.blit(bg, (0,0))
+            title_surf = TEXT.render("RUSTWALKER", (0,255,0))
+            screen.blit(title_surf, (WIDTH//2 - title_surf.get_width()//2, 80))
+            rows = range(len(self.menu_options))
+        else:
+            rows = (self._menu_idx_drawn, self.menu_idx)
+        # dibujar opciones (restaurando el fondo bajo las que cambian)
+        for i in rows:
             col = (255,255,0) if i == self.menu_idx else (0,255,0)
-            txt = FONT.render(opt, True, col)
-            screen.blit(txt, (WIDTH//2 - txt.get_width()//2, 240 + i*40))
+            txt = TEXT.render(self.menu_options[i], col)
+            area = txt.get_rect(midtop=(WIDTH//2, 240 + i*40))
+            screen.fill((0,0,0), area)
+            if bg:
+                screen.blit(bg, area, area)
+            self.dirty.add(screen.blit(txt, area))
+        self._menu_idx_drawn = self.menu_idx
 
     def update_game(self, keys, dt):
         # actualizar jugador
+        t0 = time.perf_counter()
         self.player.update(dt, keys, self.collision_rects)
 
         # sonido de movimiento en suelo (usando chequeo real bajo el jugador)
-        if abs(self.player.vel_x) > 0.1 and is_on_ground(self.player, self.collision_rects) and self.sound_move:
-            if not self.move_channel.get_busy():
-                self.move_channel.play(self.sound_move, loops=-1)
+        if abs(self.player.vel_x) > 0.1 and is_on_ground(self.player, self.collision_rects):
+            if not AUDIO.is_playing("move"):
+                AUDIO.play("move", loops=-1)
         else:
-            if self.move_channel:
-                self.move_channel.stop()
+            AUDIO.stop("move")
 
         # detectar la pulsación de Z
         attack_rect = None
@@ -763,7 +3015,7 @@ class Game:
             self.player.is_attacking = True
             self.player.frame_idx = 0.0
             self.player.attack_delay_timer = self.player.attack_delay  # 0.5 s
-            self.attack_channel.play(self.sound_attack)
+            AUDIO.play("attack")
 
         # manejar delay de ataque
         if self.player.attack_requested:
@@ -772,64 +3024,79 @@ class Game:
                 # ataque listo, disparar láser
                 self.player.attack_requested = False  # reset
 
-                # crear el láser
-                laser = Laser(
-                    x=self.player.rect.centerx - 10,
-                    y=self.player.rect.centery + 20,
-                    direction=self.player.direction,
-                    speed=500,
-                    length=380
-                )
-                self.lasers.append(laser)
-
-
+                # crear el láser (si el pool está lleno no se dispara)
+                laser = self.lasers.acquire()
+                if laser:
+                    laser.spawn(
+                        x=self.player.rect.centerx - 10,
+                        y=self.player.rect.centery + 20,
+                        direction=self.player.direction,
+                        speed=500,
+                        length=380
+                    )
+        PROFILER.add("player", t0)
 
         # actualizar láseres
-        for laser in self.lasers[:]:
+        t0 = time.perf_counter()
+        # se recorre hacia atrás: el swap-remove solo mueve láseres ya visitados
+        # barrido del trayecto de cada láser contra la broadphase de enemigos
+        # (solo vivos): a alta velocidad tampoco se salta a ninguno
+        grid = self.enemy_manager.grid
+        active = self.lasers.active
+        for i in range(len(active) - 1, -1, -1):
+            laser = active[i]
             laser.update(dt)
-            for e in self.enemies:
-                if not e.dead and laser.rect.colliderect(e.rect):
-                    e.hp -= 1
-                    e.dead = (e.hp <= 0)
-                    self.explosion_channel.play(self.sound_explosion)  # sonido de explosión
-                    
-                    # crear explosión en el centro del enemigo
-                    explosion = Explosion(e.rect.centerx, e.rect.centery, self.explosion_frames)
-                    self.explosions.append(explosion)
-
-                    laser.active = False  # el láser desaparece al impactar
+            hit = grid.sweep(laser.rect.move(-laser.moved_x, 0), laser.moved_x, 0)
+            if hit:
+                e = self.enemies[hit[2]]
+                e.hp -= 1
+                e.dead = (e.hp <= 0)
+                AUDIO.play("explosion")  # sonido de explosión
+
+                # crear explosión en el centro del enemigo
+                explosion = self.explosions.acquire()
+                if explosion:
+                    explosion.spawn(e.rect.centerx, e.rect.centery, self.explosion_frames)
+
+                laser.active = False  # el láser desaparece al impactar (solo alcanza a un enemigo)
             if not laser.active:
-                self.lasers.remove(laser)   
-
-        # colisiones con enemigos
-        for e in self.enemies:
-            e.update(dt)
-            if attack_rect and not e.dead:
-                if attack_rect.colliderect(e.rect):
+                self.lasers.release(laser)
+        PROFILER.add("lasers", t0)
+
+        # mover los enemigos en bloque según su región de actividad y copiar su posición a los rects
+        t0 = time.perf_counter()
+        updated = self.enemy_manager.update_regions(dt, self.camera.rect)
+        self.enemy_manager.sync(updated)
+        PROFILER.count("enemies_sim", len(updated))
+        if attack_rect:
+            for slot in self.enemy_manager.grid.query(attack_rect):
+                e = self.enemies[slot]
+                if not e.dead:
                     e.hp -= 1
                     e.dead = (e.hp <= 0)
+        PROFILER.add("enemies", t0)
 
-        for e in self.enemies:
-            if not e.dead and self.player.rect.colliderect(e.rect):
-                # si el jugador colisiona con un enemigo vivo, reiniciar
-                self.player.reset()
-                #reiniciar enemigos tambien
-                for en in self.enemies:
-                    en.reset()
-                break # no necesitamos chequear más
+        t0 = time.perf_counter()
+        if self.enemy_manager.grid.query(self.player.rect):
+            # si el jugador colisiona con un enemigo vivo, reiniciar
+            self.deaths["enemy"] += 1
+            self.respawn()
 
         # reinicio si cae
         if self.player.rect.top > self.world_h + 200:
-            self.player.reset()
-            for e in self.enemies:
-                e.reset()
+            self.deaths["fall"] += 1
+            self.respawn()
+        PROFILER.add("collisions", t0)
 
         # cámara
+        t0 = time.perf_counter()
         self.camera.update(self.player.rect)
 
         # guardar el attack_rect para dibujar en render
         self._attack_rect = attack_rect
         if self.world_completed:
+            # preparar el siguiente mapa mientras se muestra el mensaje
+            self._preload_next_map()
             self.level_transition_timer -= dt / 1000.0
             if self.level_transition_timer <= 0:
                 # pasar al siguiente mapa
@@ -838,109 +3105,704 @@ class Game:
                     # volver al menú
                     self.reset_to_menu()
                 else:
-                    self._load_map(self.maps[self.current_map_index])
+                    map_path = self.maps[self.current_map_index]
+                    level = self.level_loader.take(map_path)
+                    if level:
+                        self.levels[map_path] = level
+                    self._load_map(map_path, level)
                 self.world_completed = False
+        PROFILER.add("world", t0)
 
-        for exp in self.explosions[:]:
+        t0 = time.perf_counter()
+        active = self.explosions.active
+        for i in range(len(active) - 1, -1, -1):
+            exp = active[i]
             exp.update(dt)
             if exp.finished:
-                self.explosions.remove(exp)
+                self.explosions.release(exp)
+        PROFILER.add("explosions", t0)
 
 
 
-    def render_game(self):
+    def render_game(self, alpha=1.0):
+        # alpha: fracción entre el último paso de simulación y el siguiente
+        self.camera.interpolate(alpha)
+        view = self.camera.view
+        # si la cámara se mueve cambia toda la pantalla; quieta, solo lo que se mueve
+        if view != self._last_view or DEBUG:
+            self._last_view = view.copy()
+            self.dirty.invalidate()
+        damage = [] if self.dirty.enabled else None
+
         # limpiar pantalla
         if self.bg_image:
-            bg_x = -self.camera.rect.x * 0.5  # mueve la mitad de rápido
-            bg_y = -self.camera.rect.y * 0.5
-            screen.blit(pygame.transform.scale(self.bg_image, (WIDTH, HEIGHT)), (0,0))
+            bg_x = -view.x * 0.5  # mueve la mitad de rápido
+            bg_y = -view.y * 0.5
+            screen.blit(self.render_targets.scaled(self.bg_image, (WIDTH, HEIGHT)), (0,0))
         else:
             screen.fill((0,0,0))
 
-        # surface temporal del tamaño de la cámara
-        cam_surface = pygame.Surface((self.camera.rect.w, self.camera.rect.h)).convert_alpha()
-        cam_surface.fill((0,0,0,0))
+        # superficie de cámara reutilizada entre frames
+        cam_surface = self.render_targets.camera_surface(view.size)
 
         # dibujar tiles visibles en relación a la cámara
         self.draw_map_region(cam_surface, self.camera)
 
-        # dibujar enemigos
-        for e in self.enemies:
-            if not e.dead:
-                ex = e.rect.x - self.camera.rect.x
-                ey = e.rect.y - self.camera.rect.y
-                cam_surface.blit(e.image, (ex, ey))
+        # dibujar enemigos (solo los que caen dentro de la vista + margen)
+        t0 = time.perf_counter()
+        cull = view.inflate(CULL_DRAW_MARGIN * 2, CULL_DRAW_MARGIN * 2)
+        drawn = self.enemy_manager.visible(cull)
+        enemies = self.enemies
+        offsets = ASSETS.offsets
+        for i in drawn:
+            e = enemies[i]
+            ex, ey = interp_pos(e, alpha)
+            dx, dy = offsets.get(e.image, (0, 0))
+            r = cam_surface.blit(e.image, (ex - view.x + dx, ey - view.y + dy))
+            if damage is not None:
+                damage.append(r)
+        blits = len(drawn)
+        PROFILER.count("enemies_drawn", blits)
 
         # dibujar jugador
-        px = self.player.rect.x - self.camera.rect.x
-        py = self.player.rect.y - self.camera.rect.y
-        cam_surface.blit(self.player.image, (px, py)) 
+        px, py = interp_pos(self.player, alpha)
+        r = cam_surface.blit(self.player.image, ASSETS.draw_pos(self.player.image, px - view.x, py - view.y))
+        if damage is not None:
+            damage.append(r)
          
-         # dibujar láseres
+        # dibujar láseres
         for laser in self.lasers:
-            laser.draw(cam_surface, self.camera)
+            if cull.colliderect(laser.rect):
+                r = laser.draw(cam_surface, self.camera, alpha)
+                if damage is not None:
+                    damage.append(r)
+                blits += 1
 
         # dibujar explosiones
         for exp in self.explosions:
-            exp.draw(cam_surface, self.camera)
-
-
-        # escalar la cámara a la pantalla final
-        screen.blit(pygame.transform.scale(cam_surface, (WIDTH, HEIGHT)), (0,0))
+            if cull.colliderect(exp.rect):
+                r = exp.draw(cam_surface, self.camera)
+                if damage is not None and r:
+                    damage.append(r)
+                blits += 1
+        PROFILER.count("blits", blits + 1)
+        PROFILER.add("entities", t0)
+
+        # escalar la cámara a la pantalla final (sin escalar si ya coincide)
+        t0 = time.perf_counter()
+        self.render_targets.present(cam_surface)
+        if damage:
+            # de coordenadas de cámara a pantalla (+1 px por el redondeo del escalado)
+            sx, sy = WIDTH / view.w, HEIGHT / view.h
+            for r in damage:
+                self.dirty.add((int(r.x * sx) - 1, int(r.y * sy) - 1, int(r.w * sx) + 3, int(r.h * sy) + 3))
+        PROFILER.add("scale", t0)
 
         # HUD: nombre del mundo
-        txt = FONT.render(self.world_name + (" - COMPLETADO" if self.world_completed else ""), True, (255,255,255))
-        screen.blit(txt, (10,10))
+        t0 = time.perf_counter()
+        txt = TEXT.render(self.world_name + (" - COMPLETADO" if self.world_completed else ""), (255,255,255))
+        self.dirty.add(screen.blit(txt, (10,10)))
 
         # dibujar hitbox de ataque (relativa a la cámara)
         if getattr(self, "_attack_rect", None):
             ar = self._attack_rect
-            scr_rect = pygame.Rect(ar.x - self.camera.rect.x, ar.y - self.camera.rect.y, ar.w, ar.h)
-            pygame.draw.rect(screen, (255, 100, 0), scr_rect, 2)
+            scr_rect = pygame.Rect(ar.x - view.x, ar.y - view.y, ar.w, ar.h)
+            self.dirty.add(pygame.draw.rect(screen, (255, 100, 0), scr_rect, 2))
 
         # debug: dibujar colisiones
         if DEBUG:
-            for r in self.collision_rects:
-                rr = pygame.Rect(r.x - self.camera.rect.x, r.y - self.camera.rect.y, r.w, r.h)
+            for r in self.collision_rects.query(view):
+                rr = pygame.Rect(r.x - view.x, r.y - view.y, r.w, r.h)
                 pygame.draw.rect(screen, (0,255,0), rr, 1)
             # indicador on_ground
             col = (0,255,0) if self.player.on_ground else (255,0,0)
             pygame.draw.circle(screen, col, (30, 30), 8)
 
         if self.world_completed:
-            msg = FONT.render("¡MUNDO COMPLETADO!", True, (255, 255, 0))
-            screen.blit(msg, (WIDTH//2 - msg.get_width()//2, HEIGHT//2 - msg.get_height()//2))
+            msg = TEXT.render("¡MUNDO COMPLETADO!", (255, 255, 0))
+            self.dirty.add(screen.blit(msg, (WIDTH//2 - msg.get_width()//2, HEIGHT//2 - msg.get_height()//2)))
+        PROFILER.add("hud", t0)
 
     def reset_to_menu(self):
+        self.stop_recording()
         self.state = "menu"
-        self.current_map_index = 0
-        self.world_completed = False
-        self.level_transition_timer = 0.0
-        # reiniciar jugador y enemigos del primer mapa
-        self._load_map(self.maps[self.current_map_index])
-        self.player.reset()
-        for e in self.enemies:
-            e.reset()
+        # jugador, enemigos y mundo tal como estaban al arrancar (sin recargar el mapa si es el mismo)
+        self.restore(self.menu_snapshot)
         # música del menú
         if self.music_menu:
-            pygame.mixer.music.load(self.music_menu)
-            pygame.mixer.music.play(-1)
+            AUDIO.play_music(self.music_menu)
+
+
+
+# -----------------------
+# Modo headless y benchmark
+# -----------------------
+class KeyState:
+    """Teclas pulsadas con la interfaz de pygame.key.get_pressed() (keys[pygame.K_x])"""
+    def __init__(self, pressed=()):
+        self.pressed = set(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+# teclas que lee la simulación: bit i de la máscara de entrada = INPUT_KEYS[i]
+INPUT_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_SPACE, pygame.K_z)
+ACTION_SAVE_CHECKPOINT = 1 << 5  # F5
+ACTION_LOAD_CHECKPOINT = 1 << 6  # F9
+ACTION_COMPLETE_WORLD = 1 << 7  # atajo N
+_MASK_KEYS = [KeyState(k for i, k in enumerate(INPUT_KEYS) if m >> i & 1) for m in range(256)]
+
+def input_mask(keys):
+    """Entrada de un paso como byte (teclas de INPUT_KEYS)"""
+    mask = 0
+    for i, k in enumerate(INPUT_KEYS):
+        if keys[k]:
+            mask |= 1 << i
+    return mask
+
+def keys_from_mask(mask):
+    return _MASK_KEYS[mask & 0xFF]
+
+
+def scripted_input(tick, hz=SIM_HZ):
+    """Entrada determinista para benchmarks: corre, salta y dispara con un patrón fijo"""
+    t = tick / hz
+    pressed = []
+    # casi siempre a la derecha, con un pequeño retroceso cada 10 s
+    pressed.append(pygame.K_LEFT if (t % 10.0) > 9.0 else pygame.K_RIGHT)
+    if (t % 0.75) < 0.1:
+        pressed.append(pygame.K_SPACE)
+    if (t % 1.6) < 0.05:
+        pressed.append(pygame.K_z)
+    return KeyState(pressed)
+
+
+class RandomPolicy:
+    """
+    Entrada aleatoria reproducible (por semilla): mantiene cada combinación de
+    teclas un número aleatorio de pasos, con sesgo hacia la derecha.
+    """
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.keys = KeyState()
+        self.until = 0
+
+    def __call__(self, tick, game):
+        if tick >= self.until:
+            rng = self.rng
+            pressed = []
+            d = rng.random()
+            if d < 0.7:
+                pressed.append(pygame.K_RIGHT)
+            elif d < 0.85:
+                pressed.append(pygame.K_LEFT)
+            if rng.random() < 0.3:
+                pressed.append(pygame.K_SPACE)
+            if rng.random() < 0.1:
+                pressed.append(pygame.K_z)
+            self.keys = KeyState(pressed)
+            self.until = tick + rng.randint(6, 90)
+        return self.keys
+
+
+class RunnerPolicy:
+    """Siempre a la derecha; salta cuando no avanza y dispara cada cierto tiempo"""
+    def __init__(self, seed):
+        self.last_x = None
+        self.shoot_every = SIM_HZ * 2 + seed % SIM_HZ
+
+    def __call__(self, tick, game):
+        x = game.player.rect.x
+        pressed = [pygame.K_RIGHT]
+        if self.last_x is not None and x <= self.last_x:
+            pressed.append(pygame.K_SPACE)
+        if tick % self.shoot_every == 0:
+            pressed.append(pygame.K_z)
+        self.last_x = x
+        return KeyState(pressed)
+
+
+# políticas de entrada para la validación por lotes: nombre -> fábrica(semilla)
+INPUT_POLICIES = {
+    "scripted": lambda seed: (lambda tick, game: scripted_input(tick)),
+    "random": RandomPolicy,
+    "runner": RunnerPolicy,
+}
+
+
+def scale_level(level, factor):
+    """
+    Mapa sintético: repite el nivel factor veces en horizontal (tiles,
+    colisiones y enemigos con sus rutas) para medir cómo escala el juego.
+    """
+    if factor <= 1:
+        return level
+    tmx = level.tmx
+    world_w = tmx.width * tmx.tilewidth
+    big = CachedMap(tmx.width * factor, tmx.height, tmx.tilewidth, tmx.tileheight)
+    big.images = list(tmx.images)
+    for layer in tmx.visible_layers:
+        if isinstance(layer, (pytmx.TiledTileLayer, CachedTileLayer)):
+            big.layers.append(CachedTileLayer(layer.name, True, [list(row) * factor for row in layer.data]))
+
+    scaled = LevelData(level.path)
+    scaled.tmx = big
+    rects = [r.move(i * world_w, 0) for i in range(factor) for r in level.collision_rects]
+    scaled.collision_rects = SpatialGrid(rects, tmx.tilewidth, tmx.tileheight)
+    scaled.spawn = level.spawn
+    scaled.enemy_specs = [
+        (kind, x + i * world_w, y, [(px + i * world_w, py) for px, py in path])
+        for i in range(factor) for kind, x, y, path in level.enemy_specs
+    ]
+    scaled.bg_raw = level.bg_raw
+    return scaled
+
+
+def run_benchmark(map_paths, ticks=2000, scales=(1,), render=False):
+    """
+    Carga cada mapa (y sus versiones escaladas), simula ticks pasos fijos con
+    entrada scripted_input y devuelve un dict con ticks/s, tiempos por
+    subsistema y asignaciones de memoria.
+    """
+    game = Game(map_paths)
+    step_ms = 1000.0 / SIM_HZ
+    report = {"sim_hz": SIM_HZ, "ticks": ticks, "render": render, "results": []}
+
+    for map_path in map_paths:
+        for factor in scales:
+            game.current_map_index = map_paths.index(map_path)
+            game._load_map(map_path, scale_level(game._prepare_level(map_path), factor))
+            game.lasers.clear()
+            game.explosions.clear()
+            game.world_completed = False
+            game.state = "playing"
+
+            PROFILER.reset()
+            PROFILER.enabled = True
+            gc.collect()
+            gc_before = [s["collections"] for s in gc.get_stats()]
+            blocks_before = sys.getallocatedblocks()
+            t0 = time.perf_counter()
+            for tick in range(ticks):
+                game._store_prev_positions()
+                game.update_game(scripted_input(tick), step_ms)
+                if render:
+                    t_r = time.perf_counter()
+                    game.render_game()
+                    PROFILER.add("render", t_r)
+                PROFILER.end_frame()
+            elapsed = time.perf_counter() - t0
+            blocks_after = sys.getallocatedblocks()
+            gc_after = [s["collections"] for s in gc.get_stats()]
+            PROFILER.enabled = False
+
+            # coste de guardar y restaurar el estado dinámico (checkpoints, reaparición)
+            t_s = time.perf_counter()
+            for _ in range(100):
+                snap = game.snapshot()
+            save_us = (time.perf_counter() - t_s) * 1e4
+            t_s = time.perf_counter()
+            for _ in range(100):
+                game.restore(snap)
+            restore_us = (time.perf_counter() - t_s) * 1e4
+
+            report["results"].append({
+                "map": map_path.stem,
+                "scale": factor,
+                "enemies": len(game.enemies),
+                "collision_rects": len(game.collision_rects),
+                "seconds": round(elapsed, 4),
+                "ticks_per_sec": round(ticks / elapsed, 1) if elapsed > 0 else None,
+                "sections_ms": {
+                    name: {"total": round(total, 3), "mean": round(total / ticks, 5)}
+                    for name, total in sorted(PROFILER.totals.items())
+                },
+                "alloc_blocks_delta": blocks_after - blocks_before,
+                "pools": [game.lasers.stats(), game.explosions.stats()],
+                "gc_collections": [a - b for a, b in zip(gc_after, gc_before)],
+                "snapshot": {"bytes": len(snap), "save_us": round(save_us, 1),
+                             "restore_us": round(restore_us, 1)},
+                "player_x": game.player.rect.x,
+            })
+    return report
+
+
+# -----------------------
+# Validación de mapas por lotes (multiproceso)
+# -----------------------
+VALIDATE_REACH_MARGIN = 64  # px: llegar a esta distancia del borde derecho cuenta como alcanzar el final
+
+_worker_game = None  # Game de cada proceso del pool (se reutiliza entre trabajos)
+
+def _validate_init(map_paths):
+    global _worker_game
+    _worker_game = Game([Path(m) for m in map_paths])
+
+def spawn_points(game, count):
+    """
+    Hasta count posiciones de aparición repartidas por el mapa actual: encima
+    de rects de colisión lo bastante anchos y sin nada sólido en el hueco.
+    """
+    w, h = game.player.rect.size
+    found = []
+    for r in sorted(game.collision_rects, key=lambda r: (r.x, r.y)):
+        if r.w < w:
+            continue
+        spot = pygame.Rect(r.centerx - w // 2, r.top - h - 1, w, h)
+        if spot.top >= 0 and not game.collision_rects.query(spot):
+            found.append(spot.topleft)
+    if count <= 0:
+        return []
+    if len(found) <= count:
+        return found
+    step = len(found) / count
+    return [found[int(i * step)] for i in range(count)]
+
+def simulate_job(job):
+    """
+    Un trabajo de validación en el proceso actual: carga el mapa con
+    start_play, coloca al jugador en job["spawn"] (None = spawn del mapa) y
+    simula job["ticks"] pasos con la política de entrada indicada.
+    """
+    game = _worker_game
+    game.current_map_index = job["map_index"]
+    game.start_play(job["seed"])
+    if job["spawn"] is not None:
+        game.player.start_pos = tuple(job["spawn"])
+        game.player.reset()
+        game.camera.update(game.player.rect)
+    policy = INPUT_POLICIES[job["policy"]](job["seed"])
+    step_ms = 1000.0 / SIM_HZ
+    start_x = max_x = game.player.rect.x
+    worst = 0.0
+    times = np.empty(job["ticks"], dtype=np.float64)
+    t_start = time.perf_counter()
+    for tick in range(job["ticks"]):
+        keys = policy(tick, game)
+        t0 = time.perf_counter()
+        game._store_prev_positions()
+        game.update_game(keys, step_ms)
+        times[tick] = time.perf_counter() - t0
+        if game.player.rect.x > max_x:
+            max_x = game.player.rect.x
+        if game.state != "playing":
+            times = times[:tick + 1]
+            break
+    elapsed = time.perf_counter() - t_start
+    reach = max_x + game.player.rect.w
+    worst = float(times.max()) * 1000.0 if times.size else 0.0
+    return {
+        "map": Path(game.maps[job["map_index"]]).stem,
+        "spawn": list(job["spawn"]) if job["spawn"] is not None else None,
+        "policy": job["policy"],
+        "seed": job["seed"],
+        "ticks": int(times.size),
+        "start_x": start_x,
+        "max_x": max_x,
+        "reach_fraction": round(min(1.0, reach / game.world_w), 4),
+        "reached_end": reach >= game.world_w - VALIDATE_REACH_MARGIN,
+        "deaths": dict(game.deaths),
+        "ticks_per_sec": round(times.size / elapsed, 1) if elapsed > 0 else None,
+        "worst_tick_ms": round(worst, 3),
+        "p99_tick_ms": round(float(np.percentile(times, 99)) * 1000.0, 3) if times.size else 0.0,
+    }
+
+def run_validation(map_paths, ticks=3000, policies=("scripted", "random", "runner"),
+                   spawns=3, seeds=2, workers=None):
+    """
+    Valida mapas simulando muchas partidas headless independientes (mapa x
+    spawn x política x semilla) en un pool de procesos, uno por núcleo por
+    defecto. Devuelve las partidas y un resumen por mapa: alcance, muertes,
+    ticks/s y peor paso.
+    """
+    import multiprocessing
+    map_paths = [Path(m) for m in map_paths]
+    # puntos de aparición: el del mapa más `spawns` repartidos (calculados una vez aquí)
+    _validate_init(map_paths)
+    jobs = []
+    for idx, map_path in enumerate(map_paths):
+        _worker_game.current_map_index = idx
+        _worker_game.start_play(0)
+        points = [None] + spawn_points(_worker_game, spawns)
+        for spawn in points:
+            for policy in policies:
+                # la entrada guionizada no depende de la semilla: basta una partida
+                for seed in range(1 if policy == "scripted" else seeds):
+                    jobs.append({"map_index": idx, "spawn": spawn, "policy": policy,
+                                 "seed": seed, "ticks": ticks})
+
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    if workers == 1:
+        runs = [simulate_job(job) for job in jobs]
+    else:
+        # "spawn": cada proceso importa el juego de cero (pygame no es seguro tras fork).
+        # close/join y no terminate: SDL captura SIGTERM y los procesos no saldrían.
+        ctx = multiprocessing.get_context("spawn")
+        pool = ctx.Pool(workers, initializer=_validate_init,
+                        initargs=([m.as_posix() for m in map_paths],))
+        try:
+            runs = pool.map(simulate_job, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    wall = time.perf_counter() - t0
+
+    summary = {}
+    for map_path in map_paths:
+        mine = [r for r in runs if r["map"] == map_path.stem]
+        if not mine:
+            continue
+        summary[map_path.stem] = {
+            "runs": len(mine),
+            "reached_end": sum(r["reached_end"] for r in mine),
+            "best_reach_fraction": max(r["reach_fraction"] for r in mine),
+            "mean_reach_fraction": round(sum(r["reach_fraction"] for r in mine) / len(mine), 4),
+            "deaths_enemy": sum(r["deaths"]["enemy"] for r in mine),
+            "deaths_fall": sum(r["deaths"]["fall"] for r in mine),
+            "mean_ticks_per_sec": round(sum(r["ticks_per_sec"] or 0 for r in mine) / len(mine), 1),
+            "worst_tick_ms": max(r["worst_tick_ms"] for r in mine),
+        }
+    total_ticks = sum(r["ticks"] for r in runs)
+    return {
+        "sim_hz": SIM_HZ,
+        "workers": workers,
+        "jobs": len(jobs),
+        "wall_seconds": round(wall, 3),
+        "total_ticks_per_sec": round(total_ticks / wall, 1) if wall > 0 else None,
+        "summary": summary,
+        "runs": runs,
+    }
 
 
+# -----------------------
+# Grabación y replay de la entrada
+# -----------------------
+REPLAY_MAGIC = b"RWRP"
+REPLAY_VERSION = 2  # los hashes dependen de la simulación: sube si cambia el movimiento
+
+def state_hash(game):
+    """CRC32 del estado de simulación (jugador, enemigos, láseres, mundo) tras un paso"""
+    p = game.player
+    h = zlib.crc32(struct.pack("<4d4i2B", p.pos.x, p.pos.y, p.vel_x, p.vel_y, *p.rect,
+                               game.current_map_index, game.world_completed))
+    em = game.enemy_manager
+    for arr in (em.x, em.y, em.dead):
+        h = zlib.crc32(arr, h)
+    for laser in game.lasers:
+        h = zlib.crc32(struct.pack("<2d", laser.pos.x, laser.pos.y), h)
+    return h
+
+
+def _project_relpath(path):
+    """path relativa a PROJECT_DIR (con /), para que la grabación no dependa del cwd"""
+    try:
+        return Path(os.path.relpath(os.path.abspath(path), PROJECT_DIR)).as_posix()
+    except ValueError:  # otra unidad en Windows
+        return Path(os.path.abspath(path)).as_posix()
+
+def _project_path(rel):
+    """Inversa de _project_relpath: ruta usable desde el cwd actual"""
+    path = PROJECT_DIR / rel
+    try:
+        return Path(os.path.relpath(path))
+    except ValueError:
+        return path
+
+
+class InputRecorder:
+    """
+    Entrada de una partida paso a paso: un byte por paso (input_mask más
+    atajos) y el state_hash resultante. En disco: cabecera (semilla, SIM_HZ,
+    mapas relativos a PROJECT_DIR), máscaras comprimidas con zlib y hashes
+    como uint32.
+    """
+    def __init__(self, seed, maps, map_index):
+        self.seed = seed
+        self.maps = [_project_relpath(m) for m in maps]
+        self.map_index = map_index
+        self.sim_hz = SIM_HZ
+        self.masks = bytearray()
+        self.hashes = array.array("I")
+
+    def record(self, mask, state):
+        self.masks.append(mask)
+        self.hashes.append(state)
+
+    def save(self, path):
+        buf = bytearray(REPLAY_MAGIC)
+        buf += struct.pack("<HHqHHI", REPLAY_VERSION, self.sim_hz, self.seed,
+                           self.map_index, len(self.maps), len(self.masks))
+        for m in self.maps:
+            raw = m.encode("utf-8")
+            buf += struct.pack("<H", len(raw)) + raw
+        packed = zlib.compress(bytes(self.masks), 9)
+        buf += struct.pack("<I", len(packed)) + packed
+        hashes = self.hashes if sys.byteorder == "little" else array.array("I", self.hashes)
+        if sys.byteorder != "little":
+            hashes.byteswap()
+        buf += hashes.tobytes()
+        Path(path).write_bytes(bytes(buf))
+
+    @classmethod
+    def load(cls, path):
+        data = Path(path).read_bytes()
+        if data[:4] != REPLAY_MAGIC:
+            raise ValueError(f"{path} no es una grabación de RUSTWALKER")
+        version, sim_hz, seed, map_index, n_maps, ticks = struct.unpack_from("<HHqHHI", data, 4)
+        if version != REPLAY_VERSION:
+            raise ValueError(f"versión de grabación {version} no soportada")
+        off = 4 + struct.calcsize("<HHqHHI")
+        maps = []
+        for _ in range(n_maps):
+            (n,) = struct.unpack_from("<H", data, off)
+            maps.append(data[off + 2:off + 2 + n].decode("utf-8"))
+            off += 2 + n
+        (n,) = struct.unpack_from("<I", data, off)
+        off += 4
+        rec = cls(seed, (), map_index)
+        rec.maps = maps  # ya relativas a PROJECT_DIR
+        rec.sim_hz = sim_hz
+        rec.masks = bytearray(zlib.decompress(data[off:off + n]))
+        rec.hashes = array.array("I", data[off + n:off + n + 4 * ticks])
+        if sys.byteorder != "little":
+            rec.hashes.byteswap()
+        return rec
+
+
+def run_replay(path, speed=0.0, loops=1, verify=True):
+    """
+    Reproduce una grabación sin pantalla: mismos mapas, semilla y entrada por
+    paso. Con verify compara el state_hash de cada paso y para en la primera
+    divergencia. speed=0 va sin límite; speed=N la ritma a N veces el tiempo
+    real (p. ej. 100 para pruebas de resistencia). loops repite la partida.
+    """
+    rec = InputRecorder.load(path)
+    if rec.sim_hz != SIM_HZ:
+        raise ValueError(f"grabación a {rec.sim_hz} Hz, la simulación va a {SIM_HZ} Hz")
+    maps = [_project_path(m) for m in rec.maps]
+    game = Game(maps)
+    step_ms = 1000.0 / SIM_HZ
+    report = {"file": str(path), "maps": rec.maps, "seed": rec.seed, "ticks": len(rec.masks),
+              "loops": loops, "speed": speed, "diverged": None}
+    ticks_run = 0
+    t0 = time.perf_counter()
+    for loop in range(loops):
+        game.current_map_index = rec.map_index
+        game.start_play(rec.seed)
+        hashes = rec.hashes
+        for tick, mask in enumerate(rec.masks):
+            game.apply_actions(mask)
+            game._store_prev_positions()
+            game.update_game(keys_from_mask(mask), step_ms)
+            ticks_run += 1
+            if verify:
+                got = state_hash(game)
+                if got != hashes[tick]:
+                    report["diverged"] = {"loop": loop, "tick": tick, "expected": hashes[tick], "got": got}
+                    break
+            if speed > 0:
+                ahead = ticks_run / (SIM_HZ * speed) - (time.perf_counter() - t0)
+                if ahead > 0:
+                    time.sleep(ahead)
+        if report["diverged"]:
+            break
+    elapsed = time.perf_counter() - t0
+    report.update({
+        "ticks_run": ticks_run,
+        "seconds": round(elapsed, 4),
+        "ticks_per_sec": round(ticks_run / elapsed, 1) if elapsed > 0 else None,
+        "realtime_factor": round(ticks_run / SIM_HZ / elapsed, 1) if elapsed > 0 else None,
+    })
+    return report
+
 
 # -----------------------
 # Ejecutar
 # -----------------------
+def parse_args(argv):
+    import argparse
+    # sin abreviaturas: HEADLESS se decide mirando sys.argv antes de importar pygame
+    parser = argparse.ArgumentParser(description="RUSTWALKER", allow_abbrev=False)
+    parser.add_argument("--bench", action="store_true", help="benchmark determinista sin pantalla (salida JSON)")
+    parser.add_argument("--ticks", type=int, help="pasos de simulación por mapa (--bench: 2000, --validate: 3000)")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1], help="factores de mapa sintético para --bench")
+    parser.add_argument("--render", action="store_true", help="incluir el render (a superficie dummy) en --bench")
+    parser.add_argument("--out", help="archivo donde escribir el JSON de --bench")
+    parser.add_argument("--trace", help="grabar una traza Chrome de toda la sesión en este archivo")
+    parser.add_argument("--profile", action="store_true", help="empezar con el panel de perfilado (F3)")
+    parser.add_argument("--fps", type=int, default=RENDER_FPS, help="FPS objetivo al jugar")
+    parser.add_argument("--busy-loop", action="store_true", help="tick_busy_loop al jugar (menos jitter, más CPU)")
+    parser.add_argument("--record", help="grabar la entrada de cada partida en este archivo (.rwr)")
+    parser.add_argument("--seed", type=int, help="semilla de la partida grabada")
+    parser.add_argument("--replay", help="reproducir una grabación sin pantalla comprobando el estado (salida JSON)")
+    parser.add_argument("--speed", type=float, default=0.0, help="en --replay: veces el tiempo real (0 = sin límite)")
+    parser.add_argument("--loops", type=int, default=1, help="en --replay: repeticiones de la partida")
+    parser.add_argument("--validate", action="store_true", help="validar mapas con partidas headless en paralelo (salida JSON)")
+    parser.add_argument("--policies", nargs="+", default=["scripted", "random", "runner"],
+                        choices=sorted(INPUT_POLICIES), help="en --validate: políticas de entrada")
+    parser.add_argument("--spawns", type=int, default=3, help="en --validate: puntos de aparición extra por mapa")
+    parser.add_argument("--seeds", type=int, default=2, help="en --validate: semillas por combinación")
+    parser.add_argument("--workers", type=int, help="en --validate: procesos (por defecto, uno por núcleo)")
+    parser.add_argument("maps", nargs="*", help="rutas TMX (por defecto los mapas del juego)")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    mapfiles = [
-        ASSET_DIR/"maps"/"Mapa1.tmx",
-        ASSET_DIR/"maps"/"Mapa2.tmx",
-    ]
+    args = parse_args(sys.argv[1:])
+    mapfiles = [Path(m) for m in args.maps] or MAP_FILES
     mapfiles = [m for m in mapfiles if m.exists()]
     if not mapfiles:
-        print("No se encontraron mapas.")
+        log("No se encontraron mapas.")
+        pygame.quit()
+        sys.exit()
+
+    if args.trace:
+        PROFILER.start_trace()
+
+    if args.validate:
+        report = run_validation(mapfiles, ticks=3000 if args.ticks is None else args.ticks, policies=args.policies, spawns=args.spawns,
+                                seeds=args.seeds, workers=args.workers)
+        text = json.dumps(report, indent=2)
+        if args.out:
+            Path(args.out).write_text(text)
+        print(json.dumps({k: v for k, v in report.items() if k != "runs"}, indent=2))
         pygame.quit()
         sys.exit()
-    
+
+    if args.replay:
+        report = run_replay(args.replay, speed=args.speed, loops=args.loops)
+        text = json.dumps(report, indent=2)
+        if args.out:
+            Path(args.out).write_text(text)
+        print(text)
+        pygame.quit()
+        sys.exit(1 if report["diverged"] else 0)
+
+    if args.bench:
+        report = run_benchmark(mapfiles, ticks=2000 if args.ticks is None else args.ticks, scales=args.scale, render=args.render)
+        if args.trace:
+            PROFILER.dump_trace(args.trace)
+        text = json.dumps(report, indent=2)
+        if args.out:
+            Path(args.out).write_text(text)
+        print(text)
+        pygame.quit()
+        sys.exit()
+
+    if HEADLESS:
+        # sin ventana no hay entrada: la partida se quedaría en el menú para siempre
+        log("RUSTWALKER_HEADLESS=1 solo sirve con --bench, --replay o --validate")
+        pygame.quit()
+        sys.exit(2)
+
     game = Game(mapfiles)
+    game.trace_path = args.trace
+    game.record_path = args.record
+    game.seed = args.seed
+    game.show_profiler = args.profile
+    game.pacer.target_fps = args.fps
+    game.pacer.busy_loop = args.busy_loop or BUSY_LOOP
+    PROFILER.enabled = game.show_profiler or PROFILER.tracing
     game.run()